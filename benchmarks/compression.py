@@ -0,0 +1,79 @@
+"""
+Reports the trade-off between model size, load time and accuracy of pruned
+and quantized models.
+
+Usage: python -m benchmarks.compression [options]
+
+For every language, a parser is trained on the projectivized dev file
+(data/<lang>-ud-dev.conllu), as in `benchmarks.suite`, and then pruned with
+every threshold and stored with every weight type. Every stored model is
+loaded again and evaluated on the test file (data/<lang>-ud-test.conllu).
+The report gives, for every combination, the number of features of the
+tagger and the classifier, the size of the file, the time to load it, and
+the tagging accuracy and unlabelled attachment score (greedy parsing).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import parserpkg.parser as P
+import parserpkg.model_storer as S
+import parserpkg.compress as Z
+from .suite import read, tokens, timed
+
+def evaluate(model, test):
+    n = tokens(test)
+    parses = [model.parse(words, 1) for words, _, _ in test]
+    acc = sum(sum(int(g == p) for g, p in zip(gold_tags, pred_tags)) - 1
+              for (_, gold_tags, _), (pred_tags, _) in zip(test, parses)) / n
+    uas = sum(sum(int(g == p) for g, p in zip(gold_tree, pred_tree)) - 1
+              for (_, _, gold_tree), (_, pred_tree) in zip(test, parses)) / n
+    return acc, uas
+
+def report(lang, data_dir, thresholds, dtypes, limit):
+    train = read(os.path.join(data_dir, lang + "-ud-dev.conllu"), limit, projective=True)
+    test = read(os.path.join(data_dir, lang + "-ud-test.conllu"), limit)
+    parser = P.Parser()
+    for sentence in train:
+        parser.update(*sentence)
+    parser.finalize()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for threshold in [None] + thresholds:
+            model = parser if threshold is None else Z.prune(parser, threshold)
+            for dtype in dtypes:
+                file_name = os.path.join(tmp, "model.bin")
+                S.store_model(model, file_name, dtype)
+                loaded, load_s = timed(lambda: S.read_model(file_name, frozen=True))
+                acc, uas = evaluate(loaded, test)
+                tagger_features, classifier_features = Z.sizes(loaded)
+                rows.append((lang, "-" if threshold is None else str(threshold), dtype,
+                             tagger_features, classifier_features,
+                             os.path.getsize(file_name), load_s, acc, uas))
+                del loaded
+    return rows
+
+def main(argv):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.compression", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--langs", nargs="+", default=["en", "sv"], help="languages (default: en sv)")
+    ap.add_argument("--thresholds", nargs="+", type=float, default=[0.0, 0.5, 1.0, 2.0],
+                    help="pruning thresholds (default: 0 0.5 1 2)")
+    ap.add_argument("--dtypes", nargs="+", default=["f32", "f16", "i8"], choices=sorted(S.DTYPES),
+                    help="weight types (default: f32 f16 i8)")
+    ap.add_argument("--data", default="data", help="data directory (default: data)")
+    ap.add_argument("--limit", type=int, default=None, help="use only the first N sentences of every file")
+    args = ap.parse_args(argv)
+
+    print("{:<4} {:>6} {:<4} {:>9} {:>9} {:>10} {:>8} {:>8} {:>8}".format(
+        "lang", "prune", "type", "tag feat", "clf feat", "bytes", "load ms", "tag acc", "uas"))
+    for lang in args.langs:
+        for lang, threshold, dtype, tf, cf, size, load_s, acc, uas in report(
+                lang, args.data, args.thresholds, args.dtypes, args.limit):
+            print("{:<4} {:>6} {:<4} {:>9} {:>9} {:>10} {:>8.1f} {:>8.2%} {:>8.2%}".format(
+                lang, threshold, dtype, tf, cf, size, load_s * 1000, acc, uas))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,74 @@
+"""
+Reports the trade-off between table size and accuracy of hashed feature
+spaces.
+
+Usage: python -m benchmarks.hashing [options]
+
+For every language, a parser is trained on the projectivized dev file
+(data/<lang>-ud-dev.conllu), as in `benchmarks.suite`, once with the usual
+tables of interned features and once for every number of buckets, with
+unsigned and (with --signed) signed hashing. Every parser is stored and
+loaded again, and evaluated on the test file (data/<lang>-ud-test.conllu).
+The report gives, for every parser, the number of rows of the tagger and
+the classifier tables, the size of the stored file, the training time,
+and the tagging accuracy and unlabelled attachment score (greedy parsing).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import parserpkg.parser as P
+import parserpkg.model_storer as S
+from .suite import read, timed
+from .compression import evaluate
+
+def train(sentences, buckets, signed):
+    parser = P.Parser(buckets=buckets, signed=signed)
+    for sentence in sentences:
+        parser.update(*sentence)
+    parser.finalize()
+    return parser
+
+def report(lang, data_dir, buckets, signed, limit):
+    train_set = read(os.path.join(data_dir, lang + "-ud-dev.conllu"), limit, projective=True)
+    test = read(os.path.join(data_dir, lang + "-ud-test.conllu"), limit)
+    settings = [(None, False)] + [(b, False) for b in buckets]
+    if signed:
+        settings += [(b, True) for b in buckets]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for b, s in settings:
+            parser, train_s = timed(lambda: train(train_set, b, s))
+            file_name = os.path.join(tmp, "model.bin")
+            S.store_model(parser, file_name)
+            loaded = S.read_model(file_name, frozen=True)
+            acc, uas = evaluate(loaded, test)
+            rows.append((lang, "-" if b is None else str(b), "signed" if s else "-",
+                         len(loaded.tagger.weights.feature_ids), len(loaded.classifier.weights.feature_ids),
+                         os.path.getsize(file_name), train_s, acc, uas))
+            del loaded
+    return rows
+
+def main(argv):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.hashing", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--langs", nargs="+", default=["en", "sv"], help="languages (default: en sv)")
+    ap.add_argument("--buckets", nargs="+", type=int, default=[1 << 10, 1 << 12, 1 << 14, 1 << 16, 1 << 18],
+                    help="numbers of buckets (default: 2^10 2^12 2^14 2^16 2^18)")
+    ap.add_argument("--signed", action="store_true", help="also report signed hashing")
+    ap.add_argument("--data", default="data", help="data directory (default: data)")
+    ap.add_argument("--limit", type=int, default=None, help="use only the first N sentences of every file")
+    args = ap.parse_args(argv)
+
+    print("{:<4} {:>8} {:<6} {:>9} {:>9} {:>10} {:>8} {:>8} {:>8}".format(
+        "lang", "buckets", "sign", "tag rows", "clf rows", "bytes", "train s", "tag acc", "uas"))
+    for lang in args.langs:
+        for lang, b, s, tag_rows, clf_rows, size, train_s, acc, uas in report(
+                lang, args.data, args.buckets, args.signed, args.limit):
+            print("{:<4} {:>8} {:<6} {:>9} {:>9} {:>10} {:>8.2f} {:>8.2%} {:>8.2%}".format(
+                lang, b, s, tag_rows, clf_rows, size, train_s, acc, uas))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
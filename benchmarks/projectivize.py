@@ -0,0 +1,104 @@
+"""
+Measures the throughput of projectivization on the bundled UD files.
+
+Usage: python -m benchmarks.projectivize [FILE ...] [options]
+
+Projectivizes the given CoNLL-U files (by default, all data/*.conllu files)
+in three ways, and reports for each the time, the sentences and words per
+second and the megabytes of input per second:
+
+    traverse      one process, lifting with the steps of the `traverse()`
+                  generator, as `projectivize()` originally did
+    inline        one process, with `projectivize()`
+    parallel      `projectivize.run()` with --workers processes
+
+All three produce CoNLL-U text. The statistics of the files (see
+`projectivize.Stats`) are reported at the end.
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+from formattingpkg import index as IX
+from formattingpkg import projectivize as PR
+from .suite import timed
+
+def lift(heads):
+    """
+    Projectivizes a tree with the steps of `traverse()`.
+    """
+    pheads = [0] * len(heads)
+    dangling = [[] for _ in heads]
+    head_blk = [False] * len(heads)
+    for cursor, d in PR.traverse(heads):
+        if d == PR.UP:
+            if head_blk[heads[cursor]]:
+                for node in dangling[cursor]:
+                    pheads[node] = heads[cursor]
+            else:
+                dangling[heads[cursor]] += dangling[cursor]
+            dangling[cursor] = []
+            head_blk[cursor] = False
+        if d == PR.SH:
+            head_blk[cursor] = True
+            for node in dangling[cursor]:
+                pheads[node] = cursor
+            dangling[cursor] = [cursor]
+    return pheads
+
+def traverse_text(file_names):
+    chunks = []
+    for file_name in file_names:
+        with open(file_name) as fp:
+            for tree in PR.trees(fp):
+                pheads = lift(PR.heads(tree))
+                for i, row in enumerate(tree):
+                    row[6] = "%d" % pheads[i+1]
+                chunks.append("".join("\t".join(row) + "\n" for row in tree) + "\n")
+    return "".join(chunks)
+
+def inline_text(file_names):
+    return "".join(text for _, text in PR.run(file_names, 'text', 1))
+
+def parallel_text(file_names, workers):
+    return "".join(text for _, text in PR.run(file_names, 'text', workers))
+
+def main(argv):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.projectivize", description=__doc__.split("\n\n")[0])
+    ap.add_argument("files", nargs="*", help="CoNLL-U files (default: data/*.conllu)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="processes for the parallel run (default: one per CPU)")
+    args = ap.parse_args(argv)
+    file_names = args.files or sorted(glob.glob(os.path.join("data", "*.conllu")))
+
+    # The sentence indexes are built first, so that the parallel run is not
+    # charged for them.
+    for file_name in file_names:
+        IX.load(file_name).close()
+    file_stats = {}
+    list(PR.run(file_names, None, 1, file_stats))
+    stats = PR.Stats()
+    for s in file_stats.values():
+        stats.merge(s)
+    size = sum(os.path.getsize(f) for f in file_names) / 1e6
+
+    print("{:<10} {:>8} {:>12} {:>12} {:>8} {:>8}".format("method", "s", "sentences/s", "words/s", "MB/s", "speedup"))
+    baseline = None
+    outputs = []
+    for name, function in [("traverse", lambda: traverse_text(file_names)),
+                           ("inline", lambda: inline_text(file_names)),
+                           ("parallel", lambda: parallel_text(file_names, args.workers))]:
+        text, seconds = timed(function)
+        outputs.append(text)
+        baseline = baseline or seconds
+        print("{:<10} {:>8.3f} {:>12.0f} {:>12.0f} {:>8.2f} {:>7.2f}x".format(
+            name, seconds, stats.sentences / seconds, stats.words / seconds, size / seconds, baseline / seconds))
+    if any(text != outputs[0] for text in outputs):
+        print("The outputs differ!", file=sys.stderr)
+    print()
+    print(stats.report())
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
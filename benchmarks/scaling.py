@@ -0,0 +1,83 @@
+"""
+Measures how the cost per token of training and greedy parsing grows with
+the length of the sentence.
+
+Usage: python -m benchmarks.scaling TRAIN-FILE [LENGTHS...]
+
+Trains a parser on the (projectivized) TRAIN-FILE, builds long sentences by
+chaining the sentences of the file, attaching the root word of every
+sentence to the root word of the first one (which keeps the trees
+projective), and reports the time per token of `Parser.update` and of
+greedy `Parser.parse` for sentences of the given lengths (by default 10,
+50, 100, 250 and 500 tokens). With a linear-time transition system, the
+time per token should stay flat.
+"""
+
+import sys
+import time
+
+import parserpkg.parser as P
+from .suite import read
+
+def chain(sentences, length):
+    """
+    Returns a sentence of `length` words (not counting the root) made by
+    chaining projective sentences, as a (words, tags, tree) triple whose
+    tree is projective too.
+    """
+    words, tags, tree = ["<ROOT>"], ["<ROOT>"], [0]
+    first_root = None
+    for s_words, s_tags, s_tree in sentences:
+        offset = len(words) - 1
+        for k in range(1, len(s_words)):
+            words.append(s_words[k])
+            tags.append(s_tags[k])
+            head = s_tree[k] + offset if s_tree[k] != 0 else 0
+            if head == 0:
+                if first_root is None:
+                    first_root = offset + k
+                else:
+                    head = first_root
+            tree.append(head)
+            if len(words) > length:
+                break
+        if len(words) > length:
+            break
+    # Words whose head was cut off are attached to the first root, or, if
+    # that was cut off too, to the first of them, which becomes the root.
+    # In a projective tree, the arcs of these words all reach past the cut
+    # and are nested, so that the new arcs cross no others.
+    cut = [k for k in range(1, len(tree)) if tree[k] >= len(tree)]
+    if first_root is None:
+        first_root = cut[0]
+    for k in cut:
+        tree[k] = first_root if first_root != k else 0
+    return words, tags, tree
+
+def measure(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+def main(argv):
+    lengths = [int(n) for n in argv[1:]] or [10, 50, 100, 250, 500]
+    sentences = read(argv[0], projective=True)
+
+    parser = P.Parser()
+    for words, gold_tags, gold_tree in sentences:
+        parser.update(words, gold_tags, gold_tree)
+    parser.finalize()
+
+    print("{:>8} {:>16} {:>16}".format("tokens", "update us/token", "parse us/token"))
+    for length in lengths:
+        words, tags, tree = chain(sentences, length)
+        repeat = max(1, 2000 // length)
+        trainee = P.Parser()
+        update = measure(lambda: trainee.update(words, tags, tree), repeat)
+        parse = measure(lambda: parser.parse(words, 1), repeat)
+        n = len(words) - 1
+        print("{:>8} {:>16.1f} {:>16.1f}".format(n, update / n * 1e6, parse / n * 1e6))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
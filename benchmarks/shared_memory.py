@@ -0,0 +1,67 @@
+"""
+Measures the memory used by worker processes that share a model.
+
+Usage: python -m benchmarks.shared_memory MODEL TEST-FILE [WORKERS]
+
+Loads the model stored in MODEL (in the binary format) in the parent
+process, forks WORKERS (default: 4) worker processes that each parse
+TEST-FILE with it, and reports the total proportional set size (PSS) of the
+workers after parsing, once with the model read with dicts of features and
+once with the model read from a `Registry`, whose features stay in the
+mapped file. PSS counts a page shared by k processes as 1/k of a page in
+each, so the total is what the workers use together. Linux only.
+"""
+
+import multiprocessing
+import sys
+
+import parserpkg.model_storer as S
+import parserpkg.registry as R
+from formattingpkg.library import trees
+
+def pss_kb():
+    with open("/proc/self/smaps_rollup") as fp:
+        for line in fp:
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    return 0
+
+def work(model, sentences, barrier, results):
+    for words in sentences:
+        model.parse(words, 1)
+    # Measure while all workers are alive, so that shared pages are shared.
+    barrier.wait()
+    results.put(pss_kb())
+    barrier.wait()
+
+def measure(model, sentences, workers):
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=work, args=(model, sentences, barrier, results)) for _ in range(workers)]
+    for p in processes:
+        p.start()
+    total = sum(results.get() for _ in processes)
+    for p in processes:
+        p.join()
+    return total
+
+def main(argv):
+    with open(argv[1]) as fp:
+        sentences = [words for words, _, _ in trees(fp)]
+    workers = int(argv[2]) if len(argv) > 2 else 4
+
+    model = S.read_model(argv[0], frozen=True)
+    dicts = measure(model, sentences, workers)
+    del model
+
+    registry = R.Registry({'model': argv[0]})
+    registry.preload()
+    shared = measure(registry['model'], sentences, workers)
+
+    print("{} workers, total PSS after parsing {} sentences:".format(workers, len(sentences)))
+    print("  feature dicts:      {:>10} kB".format(dicts))
+    print("  shared (registry):  {:>10} kB".format(shared))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
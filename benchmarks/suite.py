@@ -0,0 +1,160 @@
+"""
+Benchmarks tagging, parsing and training throughput on the bundled UD data.
+
+Usage: python -m benchmarks.suite [options]
+
+For every language, a parser is trained on the projectivized dev file
+(data/<lang>-ud-dev.conllu), stored, and loaded again, and then used to tag
+and parse the test file (data/<lang>-ud-test.conllu). The suite reports, per
+language:
+
+    train_tokens_per_s       throughput of `Parser.update`
+    tag_tokens_per_s         throughput of `Tagger.tag` (frozen model)
+    parse_tokens_per_s@B     throughput of `Parser.parse` with beam width B
+    tagging_accuracy         on the test file
+    uas@B                    unlabelled attachment score with beam width B
+    model_bytes              size of the stored model
+    load_s                   time to load the stored model
+    peak_rss_kb              peak resident memory of the process
+
+Every language is benchmarked in a new process of its own, so that its
+peak memory does not depend on the languages that were run before it.
+
+The results are written as JSON (with --output). With --compare, the
+results are compared to a stored baseline, every metric that got worse by
+more than the threshold is reported as a regression, and the exit status
+is 1 if there is any.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import parserpkg.parser as P
+import parserpkg.model_storer as S
+from formattingpkg.library import trees
+from formattingpkg.projectivize import projectivize
+
+# Whether a higher value of a metric is better; metrics are matched on
+# their name before the '@'.
+HIGHER_IS_BETTER = {
+    'train_tokens_per_s': True,
+    'tag_tokens_per_s': True,
+    'parse_tokens_per_s': True,
+    'tagging_accuracy': True,
+    'uas': True,
+    'model_bytes': False,
+    'load_s': False,
+    'peak_rss_kb': False,
+}
+
+def read(file_name, limit=None, projective=False):
+    with open(file_name) as fp:
+        sentences = list(trees(fp))[:limit]
+    if projective:
+        sentences = [(words, tags, projectivize(tree)) for words, tags, tree in sentences]
+    return sentences
+
+def tokens(sentences):
+    return sum(len(words) - 1 for words, _, _ in sentences)
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+def benchmark(lang, data_dir, beams, limit):
+    train = read(os.path.join(data_dir, lang + "-ud-dev.conllu"), limit, projective=True)
+    test = read(os.path.join(data_dir, lang + "-ud-test.conllu"), limit)
+    n = tokens(test)
+    results = {}
+
+    parser = P.Parser()
+    _, elapsed = timed(lambda: [parser.update(*sentence) for sentence in train])
+    results['train_tokens_per_s'] = tokens(train) / elapsed
+    parser.finalize()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_name = os.path.join(tmp, lang + ".model")
+        S.store_model(parser, file_name)
+        results['model_bytes'] = os.path.getsize(file_name)
+        model, results['load_s'] = timed(lambda: S.read_model(file_name, frozen=True))
+
+        tags, elapsed = timed(lambda: [model.tagger.tag(words) for words, _, _ in test])
+        results['tag_tokens_per_s'] = n / elapsed
+        results['tagging_accuracy'] = sum(sum(int(g == p) for g, p in zip(gold_tags, pred_tags)) - 1
+                                          for (_, gold_tags, _), pred_tags in zip(test, tags)) / n
+
+        for beam in beams:
+            parses, elapsed = timed(lambda: [model.parse(words, beam) for words, _, _ in test])
+            results['parse_tokens_per_s@{}'.format(beam)] = n / elapsed
+            results['uas@{}'.format(beam)] = sum(sum(int(g == p) for g, p in zip(gold_tree, pred_tree)) - 1
+                                                 for (_, _, gold_tree), (_, pred_tree) in zip(test, parses)) / n
+        del model
+
+    results['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Returns a list of (language, metric, baseline value, value) for the
+    metrics that got worse by more than `threshold` (a fraction).
+    """
+    regressions = []
+    for lang, metrics in baseline['results'].items():
+        for metric, old in metrics.items():
+            new = results['results'].get(lang, {}).get(metric)
+            if new is None or old == 0:
+                continue
+            change = (new - old) / abs(old)
+            if not HIGHER_IS_BETTER[metric.split('@')[0]]:
+                change = -change
+            if change < -threshold:
+                regressions.append((lang, metric, old, new))
+    return regressions
+
+def main(argv):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.suite", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--langs", nargs="+", default=["en", "sv"], help="languages (default: en sv)")
+    ap.add_argument("--beams", nargs="+", type=int, default=[1, 2, 4, 8], help="beam widths (default: 1 2 4 8)")
+    ap.add_argument("--data", default="data", help="data directory (default: data)")
+    ap.add_argument("--limit", type=int, default=None, help="use only the first N sentences of every file")
+    ap.add_argument("--output", help="write the results to this JSON file")
+    ap.add_argument("--compare", help="compare the results to this baseline JSON file")
+    ap.add_argument("--threshold", type=float, default=0.10,
+                    help="relative change that counts as a regression (default: 0.10)")
+    args = ap.parse_args(argv)
+
+    results = {'meta': {'python': platform.python_version(), 'machine': platform.machine(),
+                        'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'limit': args.limit},
+               'results': {}}
+    for lang in args.langs:
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results['results'][lang] = pool.submit(benchmark, lang, args.data, args.beams, args.limit).result()
+        for metric, value in results['results'][lang].items():
+            print("{:<4} {:<24} {:>14.4f}".format(lang, metric, value))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        regressions = compare(results, baseline, args.threshold)
+        for lang, metric, old, new in regressions:
+            print("REGRESSION {} {}: {:.4f} -> {:.4f}".format(lang, metric, old, new))
+        if len(regressions) > 0:
+            return 1
+        print("No regressions against {}".format(args.compare))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
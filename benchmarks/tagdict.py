@@ -0,0 +1,50 @@
+"""
+Measures the effect of the tag dictionary on tagging speed and accuracy.
+
+Usage: python -m benchmarks.tagdict TRAIN-FILE TEST-FILE
+
+Trains a parser on the projectivized trees of TRAIN-FILE (as in
+`benchmarks.suite`), freezes it, and tags TEST-FILE with and without the
+tag dictionary, reporting tokens per second and tagging accuracy for both,
+and the speedup and the accuracy delta.
+"""
+
+import sys
+import time
+
+import parserpkg.frozen as F
+import parserpkg.training as TR
+from .suite import read
+
+def run(tagger, test):
+    start = time.perf_counter()
+    predictions = [tagger.tag(words) for words, _, _ in test]
+    elapsed = time.perf_counter() - start
+    k = sum(sum(int(g == p) for g, p in zip(gold_tags, pred_tags)) - 1
+            for (_, gold_tags, _), pred_tags in zip(test, predictions))
+    n = sum(len(words) - 1 for words, _, _ in test)
+    return n / elapsed, k / n
+
+def main(argv):
+    # The parser can only derive projective trees, so it is trained on the
+    # projectivized ones.
+    train = read(argv[0], projective=True)
+    test = read(argv[1])
+
+    model = TR.train(train, workers=1)
+    model.finalize()
+    tagger = F.freeze(model).tagger
+
+    tagger.use_tag_dict = False
+    speed_off, acc_off = run(tagger, test)
+    tagger.use_tag_dict = True
+    tagger.set_cache(tagger.cache.maxsize)
+    speed_on, acc_on = run(tagger, test)
+
+    print("Tag dictionary entries: {}".format(len(tagger.tag_dict)))
+    print("Without tag dictionary: {:.0f} tokens/s, accuracy {:.2%}".format(speed_off, acc_off))
+    print("With tag dictionary:    {:.0f} tokens/s, accuracy {:.2%}".format(speed_on, acc_on))
+    print("Speedup: {:.2f}x, accuracy delta: {:+.2%}".format(speed_on / speed_off, acc_on - acc_off))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,247 @@
+"""
+Byte-offset indexes of the sentences in CoNLL-U files.
+
+Usage: python -m formattingpkg.index CONLLU-FILE [START [STOP]]
+
+Readers such as `library.conllu()` go through a file line by line, so
+getting to sentence N, sampling sentences or splitting a file between
+workers takes a scan of everything before. An index records the byte
+offset and length of every sentence (its comment lines and rows, without
+the blank line that ends it), so that any sentence, or any range of
+consecutive sentences, can be read from a memory-mapped file without
+touching the rest of it. Blocks of comments without any rows are not
+sentences, as in `library.conllu()`.
+
+The index is built in one pass over the memory-mapped file and saved next
+to it (by default, the file name with ".idx" appended), as a fixed header
+
+    magic (8 bytes) | version (uint32) | sentences (uint64)
+        | file size (uint64) | file modification time (uint64, ns)
+
+followed by the offsets and the lengths of the sentences, as two arrays of
+little-endian uint64. `load()` uses a saved index if the size and the
+modification time of the file are the ones stored in it, and otherwise
+builds it again.
+
+Without START, the command prints the number of sentences and bytes of the
+file, and otherwise the sentences from START up to STOP (or just sentence
+START) in the CoNLL-U format.
+"""
+
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+
+from . import library as L
+
+MAGIC = b"CONLLIDX"
+VERSION = 1
+HEADER = struct.Struct('<8sIQQQ')
+
+# Runs of blank lines separate sentences, and a sentence has at least one
+# line that is not a comment.
+BLANK = re.compile(rb"(?:^[ \t\r\f\v]*(?:\n|\Z))+", re.M)
+ROW = re.compile(rb"^[^#]", re.M)
+
+def scan(data):
+    """
+    Returns the offsets and lengths of the sentences in `data`, a bytes-like
+    object with the content of a CoNLL-U file.
+    """
+    offsets = array('Q')
+    lengths = array('Q')
+    start = 0
+    for blank in BLANK.finditer(data):
+        end = blank.start()
+        if end > start and ROW.search(data, start, end) is not None:
+            offsets.append(start)
+            lengths.append(end - start)
+        start = blank.end()
+    if start < len(data) and ROW.search(data, start) is not None:
+        offsets.append(start)
+        lengths.append(len(data) - start)
+    return offsets, lengths
+
+def little_endian(numbers):
+    if sys.byteorder != 'little':
+        numbers = array(numbers.typecode, numbers)
+        numbers.byteswap()
+    return numbers.tobytes()
+
+class Index(Sequence):
+    """
+    The sentences of a CoNLL-U file, read from the memory-mapped file by
+    their offsets.
+
+    Indexing gives the text of a sentence, and `text()`, `lines()`,
+    `sentences()` and `trees()` read ranges of consecutive sentences.
+    """
+
+    def __init__(self, file_name, offsets, lengths):
+        self.file_name = file_name
+        self.offsets = offsets
+        self.lengths = lengths
+        self.data = None
+        if os.path.getsize(file_name) > 0:
+            with open(file_name, 'rb') as file:
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[j] for j in range(*k.indices(len(self)))]
+        if k < 0:
+            k += len(self)
+        offset = self.offsets[k]
+        return self.data[offset:offset + self.lengths[k]].decode('utf-8')
+
+    def span(self, start=0, stop=None):
+        """
+        Returns the byte offsets (begin, end) of the sentences from `start`
+        up to `stop`, which may be negative, as in slices.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return 0, 0
+        return self.offsets[start], self.offsets[stop - 1] + self.lengths[stop - 1]
+
+    def lines(self, start=0, stop=None):
+        """
+        Yields the lines of the sentences from `start` up to `stop`, with
+        their newlines, and a blank line after the last one, so that they
+        can be read with the functions of `library`.
+        """
+        begin, end = self.span(start, stop)
+        data = self.data
+        while begin < end:
+            newline = data.find(b"\n", begin, end)
+            next_begin = end if newline < 0 else newline + 1
+            line = data[begin:next_begin].decode('utf-8')
+            yield line if line.endswith("\n") else line + "\n"
+            begin = next_begin
+        if end > 0:
+            yield "\n"
+
+    def text(self, start=0, stop=None):
+        """
+        Returns the sentences from `start` up to `stop` in the CoNLL-U
+        format, as one string.
+        """
+        return "".join(self.lines(start, stop))
+
+    def sentences(self, start=0, stop=None):
+        """
+        Returns the sentences from `start` up to `stop` as (comments, rows)
+        pairs, as in `library.sentences()`.
+        """
+        return list(L.sentences(self.lines(start, stop)))
+
+    def trees(self, start=0, stop=None):
+        """
+        Returns the sentences from `start` up to `stop` as (words, tags,
+        tree) triples, as in `library.trees()`.
+        """
+        return list(L.trees(self.lines(start, stop)))
+
+    def shards(self, n):
+        """
+        Splits the sentences into `n` ranges of consecutive sentences with
+        about the same number of bytes, and returns them as (start, stop)
+        pairs. Ranges may be empty if there are fewer than `n` sentences.
+        """
+        begin, end = self.span()
+        bounds = [0]
+        k = 0
+        for j in range(1, n):
+            target = begin + (end - begin) * j // n
+            while k < len(self) and self.offsets[k] < target:
+                k += 1
+            bounds.append(max(k, bounds[-1]))
+        bounds.append(len(self))
+        return list(zip(bounds, bounds[1:]))
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+def stamp(file_name):
+    info = os.stat(file_name)
+    return info.st_size, info.st_mtime_ns
+
+def build(file_name, index_file=None):
+    """
+    Builds the index of a CoNLL-U file, saves it to `index_file` (by
+    default, the file name with ".idx" appended) and returns it.
+    """
+    if index_file is None:
+        index_file = file_name + ".idx"
+    size, mtime = stamp(file_name)
+    if size > 0:
+        with open(file_name, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                offsets, lengths = scan(data)
+    else:
+        offsets, lengths = array('Q'), array('Q')
+    tmp = "{}.{}.tmp".format(index_file, os.getpid())
+    with open(tmp, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(offsets), size, mtime))
+        file.write(little_endian(offsets))
+        file.write(little_endian(lengths))
+    os.replace(tmp, index_file)
+    return Index(file_name, offsets, lengths)
+
+def read(index_file):
+    """
+    Reads a saved index and returns the (size, modification time) of the
+    file it was built from, the offsets and the lengths.
+    """
+    with open(index_file, 'rb') as file:
+        header = file.read(HEADER.size)
+        magic, version, n, size, mtime = HEADER.unpack(header)
+        if magic != MAGIC or version > VERSION:
+            raise ValueError("{} is not an index file of version {} or older".format(index_file, VERSION))
+        offsets = array('Q')
+        lengths = array('Q')
+        offsets.fromfile(file, n)
+        lengths.fromfile(file, n)
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+        lengths.byteswap()
+    return (size, mtime), offsets, lengths
+
+def load(file_name, index_file=None):
+    """
+    Returns the index of a CoNLL-U file, read from `index_file` (by
+    default, the file name with ".idx" appended) if it is up to date, and
+    otherwise built and saved first.
+    """
+    if index_file is None:
+        index_file = file_name + ".idx"
+    if os.path.isfile(index_file):
+        try:
+            saved, offsets, lengths = read(index_file)
+            if saved == stamp(file_name):
+                return Index(file_name, offsets, lengths)
+        except (ValueError, EOFError, struct.error):
+            pass
+    return build(file_name, index_file)
+
+def main(argv):
+    index = load(argv[0])
+    if len(argv) == 1:
+        begin, end = index.span()
+        print("{} sentences, {} bytes".format(len(index), end - begin))
+    else:
+        start = int(argv[1])
+        stop = int(argv[2]) if len(argv) > 2 else start + 1
+        sys.stdout.write(index.text(start, stop))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
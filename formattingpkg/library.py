@@ -28,3 +28,82 @@ def trees(fp):
             result[1].append(word[3])
             result[2].append(int(word[6]))
         yield result
+
+def sentences(fp):
+    """
+    Reads sentences in the CoNLL-U format from an input source.
+
+    Unlike `conllu()`, this keeps everything that is needed to write the
+    sentences back: every sentence is returned as a pair of its comment
+    lines and its rows, where a row is the list of the ten columns of a
+    line, including multiword tokens and empty nodes.
+    """
+    comments = []
+    rows = []
+    for line in fp:
+        line = line.rstrip('\r\n')
+        if line.startswith('#'):
+            comments.append(line)
+        elif len(line.strip()) > 0:
+            rows.append(line.split('\t'))
+        elif len(rows) > 0 or len(comments) > 0:
+            yield comments, rows
+            comments = []
+            rows = []
+    if len(rows) > 0:
+        yield comments, rows
+
+def text_sentences(fp):
+    """
+    Reads sentences, one per line with tokens separated by whitespace, and
+    returns them in the same form as `sentences()`. Lines that start with
+    '#' are kept as comments of the next sentence.
+    """
+    comments = []
+    for line in fp:
+        line = line.strip()
+        if line.startswith('#'):
+            comments.append(line)
+        elif len(line) > 0:
+            rows = [[str(k + 1), w, "_", "_", "_", "_", "_", "_", "_", "_"]
+                    for k, w in enumerate(line.split())]
+            yield comments + ["# text = " + line], rows
+            comments = []
+
+def is_word(row):
+    """
+    Tells whether a row is a syntactic word, as opposed to a multiword
+    token or an empty node.
+    """
+    return row[0].isdigit()
+
+def words(rows):
+    """
+    Returns the word forms of a sentence, preceded by the root.
+    """
+    return ["<ROOT>"] + [row[1] for row in rows if is_word(row)]
+
+def fill(rows, tags, tree):
+    """
+    Fills in the predicted tags and heads of a sentence, as returned by the
+    parser for `words(rows)`. The dependency relations are set to the
+    generic `root` and `dep`.
+    """
+    k = 1
+    for row in rows:
+        if is_word(row):
+            row[3] = tags[k]
+            row[6] = str(tree[k])
+            row[7] = "root" if tree[k] == 0 else "dep"
+            k += 1
+    return rows
+
+def write(fp, comments, rows):
+    """
+    Writes a sentence in the CoNLL-U format.
+    """
+    for line in comments:
+        fp.write(line + "\n")
+    for row in rows:
+        fp.write("\t".join(row) + "\n")
+    fp.write("\n")
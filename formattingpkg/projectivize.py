@@ -1,12 +1,35 @@
 """
 Projectivize trees in the CoNLL-X format using lifting
 
-Usage: python projectivize.py < CONLL > CONLL
+Usage: python -m formattingpkg.projectivize [FILE ...] [options]
 
-Bonus: Count the number of projective trees
+Projectivizes the trees in the given CoNLL-U files (or stdin) and writes
+them to stdout, or with --output-dir, every file to a file of the same name
+in that directory. Files are split into ranges of sentences with their
+sentence index (see `formattingpkg.index`), which are projectivized in
+parallel by --workers processes. With --stats, the projectivity rate, the
+number of lifted arcs and the sentence lengths are reported on stderr, and
+with --count, only these are reported.
+
+For training, `load()` returns the projectivized (words, tags, tree)
+triples of a list of files directly, without writing them out.
 """
 
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from . import index as IX
+from . import library as L
+
+CHUNK_SIZE = 1 << 20    # Bytes of input per range of sentences, for parallel runs
+
 def trees(fp):
+    """
+    Reads the sentences of a CoNLL-U file as lists of the columns of their
+    words, without multiword tokens and empty nodes.
+    """
     buffer = []
     for line in fp:
         line = line.rstrip() # strip off the trailing newline
@@ -16,7 +39,7 @@ def trees(fp):
                 buffer = []
             else:
                 columns = line.split()
-                if columns[0].isdigit(): # skip range tokens
+                if L.is_word(columns):
                     buffer.append(columns)
 
 def heads(rows):
@@ -62,51 +85,284 @@ def is_projective(heads):
     return True
 
 def projectivize(heads):
-    pheads = [0] * len(heads)
+    """
+    Returns the heads of the projective tree that lifts the non-projective
+    arcs of a tree, given by its heads, as few levels as necessary.
+
+    This follows the steps of `traverse()`, but inlined, so that no tuple is
+    created per step: the words are visited in order, and every word is
+    reached from the previous one by going up to their lowest common
+    ancestor and down from there.
+    """
+    n = len(heads)
+    pheads = [0] * n
     dangling = [[] for _ in heads]
-    head_blk = [False] * len(heads)
-    for cursor, d in traverse(heads):
-        if d == UP:
-            if head_blk[heads[cursor]]:
+    head_blk = [False] * n
+    marked = [False] * n
+    marked[0] = True
+    cursor = 0
+    for i in range(n + 1):
+        bend = i if i < n else 0
+        path = []
+        while not marked[bend]:
+            path.append(bend)
+            bend = heads[bend]
+        while cursor != bend:
+            # Going up from the cursor to its head.
+            head = heads[cursor]
+            if head_blk[head]:
                 for node in dangling[cursor]:
-                    pheads[node] = heads[cursor]
+                    pheads[node] = head
             else:
-                dangling[heads[cursor]] += dangling[cursor]
+                dangling[head] += dangling[cursor]
             dangling[cursor] = []
             head_blk[cursor] = False
-        if d == SH:
-            head_blk[cursor] = True
-            for node in dangling[cursor]:
-                pheads[node] = cursor
-            dangling[cursor] = [cursor]
+            marked[cursor] = False
+            cursor = head
+        if i == n:
+            break
+        while len(path) > 0:
+            cursor = path.pop()
+            marked[cursor] = True
+        head_blk[cursor] = True
+        for node in dangling[cursor]:
+            pheads[node] = cursor
+        dangling[cursor] = [cursor]
     return pheads
 
-def projectivized_trees(fp):
+class Stats():
+    """
+    Counts of projectivized trees: the number of sentences, words and
+    projective trees, the number of lifted arcs, and the lengths of the
+    sentences, in buckets of ten words.
+    """
+
+    def __init__(self):
+        self.sentences = 0
+        self.words = 0
+        self.projective = 0
+        self.lifted = 0
+        self.longest = 0
+        self.lengths = {}
+
+    def add(self, heads, pheads):
+        """
+        Counts a tree, given by its heads and its projectivized heads.
+        """
+        n = len(heads) - 1
+        lifted = sum(h != p for h, p in zip(heads, pheads))
+        self.sentences += 1
+        self.words += n
+        self.projective += lifted == 0
+        self.lifted += lifted
+        self.longest = max(self.longest, n)
+        bucket = n // 10 * 10
+        self.lengths[bucket] = self.lengths.get(bucket, 0) + 1
+
+    def merge(self, other):
+        """
+        Adds the counts of another `Stats` to these, and returns them.
+        """
+        self.sentences += other.sentences
+        self.words += other.words
+        self.projective += other.projective
+        self.lifted += other.lifted
+        self.longest = max(self.longest, other.longest)
+        for bucket, k in other.lengths.items():
+            self.lengths[bucket] = self.lengths.get(bucket, 0) + k
+        return self
+
+    def as_dict(self):
+        return {'sentences': self.sentences, 'words': self.words, 'projective': self.projective,
+                'lifted': self.lifted, 'longest': self.longest,
+                'lengths': {str(b): k for b, k in sorted(self.lengths.items())}}
+
+    def report(self):
+        """
+        Returns the counts as lines of text.
+        """
+        n = max(self.sentences, 1)
+        lines = ["{} sentences, {} words".format(self.sentences, self.words),
+                 "projective: {:.2%} ({} sentences)".format(self.projective / n, self.projective),
+                 "lifted arcs: {} ({:.2%} of all arcs)".format(self.lifted, self.lifted / max(self.words, 1)),
+                 "length: mean {:.1f}, longest {}".format(self.words / n, self.longest)]
+        for bucket, k in sorted(self.lengths.items()):
+            lines.append("  {:>3}-{:<3} {:>7} {:>7.2%}".format(bucket, bucket + 9, k, k / n))
+        return "\n".join(lines)
+
+def projectivized_trees(fp, stats=None):
     for tree in trees(fp):
-        pheads = projectivize(heads(tree))
+        hs = heads(tree)
+        pheads = projectivize(hs)
+        if stats is not None:
+            stats.add(hs, pheads)
         for i, row in enumerate(tree):
             row[6] = "%d" % pheads[i+1]
         yield tree
 
-def emit(tree):
+def emit(tree, fp=None):
+    fp = fp if fp is not None else sys.stdout
     for row in tree:
-        print("\t".join(row))
-    print()
-
-def cmd_count_projective():
-    import sys
-    k = 0
-    n = 0
-    for tree in trees(sys.stdin):
-        k += is_projective(heads(tree))
-        n += 1
-    print("{:.2%}".format(k / n))
-    
-def cmd_projectivize():
-    import sys
-    for ptree in projectivized_trees(sys.stdin):
-        emit(ptree)
+        fp.write("\t".join(row) + "\n")
+    fp.write("\n")
+
+def project(lines, output, stats):
+    """
+    Projectivizes the sentences read from `lines`, counts them in `stats`,
+    and yields every sentence as it is projectivized: as CoNLL-U text if
+    `output` is 'text', as a (words, tags, tree) triple if it is 'trees',
+    and as None if it is None. Both outputs only have the syntactic words
+    of the sentences (see `trees()`).
+    """
+    for tree in projectivized_trees(lines, stats):
+        if output == 'text':
+            yield "".join("\t".join(row) + "\n" for row in tree) + "\n"
+        elif output == 'trees':
+            # As `library.trees()`, which skips empty sentences.
+            if len(tree) > 0:
+                yield (["<ROOT>"] + [row[1] for row in tree], ["<ROOT>"] + [row[3] for row in tree],
+                       [0] + [int(row[6]) for row in tree])
+        else:
+            yield None
+
+def project_range(file_name, start, stop, output):
+    """
+    Projectivizes the sentences from `start` up to `stop` of a file, read
+    with its index, and returns them with their `Stats`: as one string of
+    CoNLL-U text if `output` is 'text', as a list of (words, tags, tree)
+    triples if it is 'trees', and not at all if it is None.
+    """
+    stats = Stats()
+    index = IX.load(file_name)
+    try:
+        sentences = list(project(index.lines(start, stop), output, stats))
+    finally:
+        index.close()
+    if output == 'text':
+        return "".join(sentences), stats
+    return sentences if output == 'trees' else None, stats
+
+def ranges(file_name, workers):
+    """
+    Splits a file into ranges of sentences, at least one per worker and
+    otherwise of about `CHUNK_SIZE` bytes.
+    """
+    index = IX.load(file_name)
+    try:
+        begin, end = index.span()
+        return index.shards(max(workers, (end - begin) // CHUNK_SIZE, 1))
+    finally:
+        index.close()
+
+def run(file_names, output='text', workers=None, stats=None):
+    """
+    Projectivizes the sentences of a list of files in ranges (see
+    `project_range()`), in `workers` processes (by default, one per CPU),
+    and yields the file name and the result of every range, in order, as
+    soon as it is done. At most two ranges per worker are held at a time.
+    With a single worker, the files are read without their indexes, and
+    every sentence is yielded as a range of its own.
+    If `stats` is given, the `Stats` of every file are put in it, by file
+    name.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if stats is None:
+        stats = {}
+
+    if workers <= 1:
+        # In one process, the files are simply read through, and every
+        # sentence is yielded on its own.
+        for file_name in file_names:
+            file_stats = stats.setdefault(file_name, Stats())
+            with open(file_name) as fp:
+                for result in project(fp, output, file_stats):
+                    if result is not None:
+                        yield file_name, [result] if output == 'trees' else result
+        return
+
+    jobs = ((file_name, start, stop) for file_name in file_names
+            for start, stop in ranges(file_name, workers))
+
+    def done(file_name, result, part_stats):
+        stats.setdefault(file_name, Stats()).merge(part_stats)
+        return file_name, result
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for file_name, start, stop in jobs:
+            pending.append((file_name, pool.submit(project_range, file_name, start, stop, output)))
+            while len(pending) >= 2 * workers or (len(pending) > 0 and pending[0][1].done()):
+                file_name, future = pending.popleft()
+                file_name, result = done(file_name, *future.result())
+                if result is not None:
+                    yield file_name, result
+        while len(pending) > 0:
+            file_name, future = pending.popleft()
+            file_name, result = done(file_name, *future.result())
+            if result is not None:
+                yield file_name, result
+
+def load(file_names, workers=None):
+    """
+    Returns the projectivized (words, tags, tree) triples of a list of
+    files, as `library.trees()`, and their `Stats`.
+    """
+    sentences = []
+    stats = {}
+    for _, result in run(file_names, 'trees', workers, stats):
+        sentences += result
+    total = Stats()
+    for file_stats in stats.values():
+        total.merge(file_stats)
+    return sentences, total
+
+def main(argv):
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="python -m formattingpkg.projectivize",
+                                 description="Projectivize trees in the CoNLL-U format using lifting.")
+    ap.add_argument("files", nargs="*", help="input files (default: stdin)")
+    ap.add_argument("--output-dir", help="write every file to this directory instead of stdout")
+    ap.add_argument("--workers", type=int, default=None, help="number of processes (default: one per CPU)")
+    ap.add_argument("--stats", action="store_true", help="report statistics on stderr")
+    ap.add_argument("--count", action="store_true", help="only report statistics, on stdout")
+    args = ap.parse_args(argv)
+    if args.output_dir and not args.files:
+        ap.error("--output-dir needs input files")
+
+    output = None if args.count else 'text'
+    stats = {}
+    if args.files:
+        results = run(args.files, output, args.workers, stats)
+    else:
+        stats["<stdin>"] = Stats()
+        results = (("<stdin>", text) for text in project(sys.stdin, output, stats["<stdin>"]))
+
+    # The output is written as it is projectivized, so that only a few
+    # ranges of sentences are held in memory however large the input is.
+    current = None
+    target = sys.stdout
+    try:
+        for file_name, text in results:
+            if args.output_dir and file_name != current:
+                if target is not sys.stdout:
+                    target.close()
+                target = open(os.path.join(args.output_dir, os.path.basename(file_name)), 'w')
+                current = file_name
+            if text is not None:
+                target.write(text)
+    finally:
+        if target is not sys.stdout:
+            target.close()
+
+    total = Stats()
+    for file_name in stats:
+        total.merge(stats[file_name])
+        if args.stats and len(args.files) > 1:
+            print("{}:\n{}".format(file_name, stats[file_name].report()), file=sys.stderr)
+    if args.count or args.stats:
+        print(total.report(), file=sys.stdout if args.count else sys.stderr)
 
 if __name__ == "__main__":
-    #cmd_count_projective()
-    cmd_projectivize()
\ No newline at end of file
+    main(sys.argv[1:])
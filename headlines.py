@@ -4,54 +4,62 @@ import parserpkg.classifier as C
 import parserpkg.tagger as T
 import parserpkg.parser as P
 import parserpkg.model_storer as S
+import parserpkg.training as TR
+import parserpkg.corpus as CO
+import parserpkg.model_cache as MC
+import parserpkg.query as Q
 from formattingpkg.library import *
 
 n_examples = None    # Set to None to train on all examples
+epochs = 1           # Number of passes over the training data
+train_workers = 1    # Set above 1 to train in parallel with iterative parameter mixing
+checkpoint = None    # Set to a file name to save training checkpoints and resume from them
+cache_dir = None     # Directory of trained models (default: $SYNPARSE_CACHE or ~/.cache/syntacticparser)
+projectivize = False # Set to True to projectivize the training trees, if the training file is not projective
+buckets = None       # Set to a number of buckets to hash the features into fixed-size tables
+signed_hashing = False  # Whether hashed features add or subtract the weights of their bucket
 
-if (len(sys.argv) == 4 and sys.argv[3] == "yes") and os.path.isfile(sys.argv[1] + ".trained.json"):
-    parser = S.read_model(sys.argv[1] + ".trained.json")
-else:
-    parser = P.Parser()
-    with open(sys.argv[1]) as fp:
-        for i, (words, gold_tags, gold_tree) in enumerate(trees(fp)):
-            parser.update(words, gold_tags, gold_tree)
-            print("\rUpdated with sentence #{}".format(i), end="")
-            if n_examples and i >= n_examples:
-                break
-        print("")
+def train():
+    sentences = CO.load(sys.argv[1], projectivize=projectivize, workers=train_workers)
+    if n_examples:
+        sentences = sentences[:n_examples + 1]
+    parser = TR.train(sentences, epochs, train_workers, P.Parser(buckets=buckets, signed=signed_hashing),
+                      verbose=True, checkpoint=checkpoint, resume=checkpoint is not None)
     parser.finalize()
-    S.store_model(parser, sys.argv[1] + ".trained.json")
+    return parser
 
+# The model is only trained if the training file or the configuration has
+# changed since it was last trained.
+config = {'n_examples': n_examples, 'epochs': epochs, 'train_workers': train_workers,
+          'projectivize': projectivize, 'buckets': buckets, 'signed_hashing': signed_hashing}
+parser = MC.ModelCache(cache_dir).get(sys.argv[1], config, train)
+
+store = Q.TreeStore()
 with open(sys.argv[2]) as fp:
-    for i, line in enumerate(fp):
+    for line in fp:
         if line[0] == '#' or line in ['\n', '\r\n']:
             continue
-        
-        words = line.split()
-        pred_tags, pred_tree = parser.parse(words)
-
-        root = None
-        right = []
-        left = []
-
-        for j in range(0, len(pred_tree)):
-            if pred_tree[j] == 0 and pred_tags[j] == "VERB":
-                root = j
-
-        for j in range(0, len(pred_tree)):
-            if pred_tree[j] == root and pred_tags[j] == "NOUN":
-                if j < root:
-                    left.append(words[j])
-                else:
-                    right.append(words[j])
-
-        print(words)
-        print(pred_tags)
-        print(pred_tree)
-        if root is not None:
-            print("LEFT: ", left, "ROOT: ", words[root], ", RIGHT: ", right)
-        else:
-            print("COULD NOT FIND VERB ROOT!")
-        print("")
+
+        words = ["<ROOT>"] + line.split()
+        pred_tags, pred_tree = parser.parse(words, 1)
+        store.add(words, pred_tags, pred_tree)
+
+# A VERB attached to <ROOT>, with its NOUN dependents on either side; if a
+# sentence has several such roots, the last one is used.
+pattern = Q.Pattern("VERB", root=True).collect("NOUN", Q.LEFT).collect("NOUN", Q.RIGHT)
+roots = {match.sentence: match for match in store.find(pattern)}
+
+for k, (words, pred_tags, pred_tree) in enumerate(store.sentences):
+    print(words[1:])
+    print(pred_tags[1:])
+    print(pred_tree[1:])
+    match = roots.get(k)
+    if match is not None:
+        left = [words[j] for j in match.dependents[("NOUN", Q.LEFT)]]
+        right = [words[j] for j in match.dependents[("NOUN", Q.RIGHT)]]
+        print("LEFT: ", left, "ROOT: ", words[match.head], ", RIGHT: ", right)
+    else:
+        print("COULD NOT FIND VERB ROOT!")
+    print("")
 
 print("")
@@ -4,36 +4,48 @@ import parserpkg.classifier as C
 import parserpkg.tagger as T
 import parserpkg.parser as P
 import parserpkg.model_storer as S
+import parserpkg.training as TR
+import parserpkg.corpus as CO
+import parserpkg.model_cache as MC
 from formattingpkg.library import *
 
 n_examples = None    # Set to None to train on all examples
+epochs = 1           # Number of passes over the training data
+train_workers = 1    # Set above 1 to train in parallel with iterative parameter mixing
+checkpoint = None    # Set to a file name to save training checkpoints and resume from them
+cache_dir = None     # Directory of trained models (default: $SYNPARSE_CACHE or ~/.cache/syntacticparser)
+projectivize = False # Set to True to projectivize the training trees, if the training file is not projective
+buckets = None       # Set to a number of buckets to hash the features into fixed-size tables
+signed_hashing = False  # Whether hashed features add or subtract the weights of their bucket
 
-#beam_width = int(sys.argv[3])
+beam_width = int(sys.argv[3]) if len(sys.argv) >= 4 else 1
+workers = os.cpu_count()
 
-if (len(sys.argv) == 5 and sys.argv[4] == "yes") and os.path.isfile(sys.argv[1] + ".trained.json"):
-    parser = S.read_model(sys.argv[1] + ".trained.json")
-else:
-    parser = P.Parser()
-    with open(sys.argv[1]) as fp:
-        for i, (words, gold_tags, gold_tree) in enumerate(trees(fp)):
-            parser.update(words, gold_tags, gold_tree)
-            print("\rUpdated with sentence #{}".format(i), end="")
-            if n_examples and i >= n_examples:
-                break
-        print("")
+def train():
+    sentences = CO.load(sys.argv[1], projectivize=projectivize, workers=train_workers)
+    if n_examples:
+        sentences = sentences[:n_examples + 1]
+    parser = TR.train(sentences, epochs, train_workers, P.Parser(buckets=buckets, signed=signed_hashing),
+                      verbose=True, checkpoint=checkpoint, resume=checkpoint is not None)
     parser.finalize()
-    S.store_model(parser, sys.argv[1] + ".trained.json")
+    return parser
+
+# The model is only trained if the training file or the configuration has
+# changed since it was last trained.
+config = {'n_examples': n_examples, 'epochs': epochs, 'train_workers': train_workers,
+          'projectivize': projectivize, 'buckets': buckets, 'signed_hashing': signed_hashing}
+parser = MC.ModelCache(cache_dir).get(sys.argv[1], config, train)
 
 acc_k = acc_n = 0
 uas_k = uas_n = 0
 with open(sys.argv[2]) as fp:
-    for i, (words, gold_tags, gold_tree) in enumerate(trees(fp)):
-        pred_tags, pred_tree = parser.parse(words, beam_width)
-        acc_k += sum(int(g == p) for g, p in zip(gold_tags, pred_tags)) - 1
-        acc_n += len(words) - 1
-        uas_k += sum(int(g == p) for g, p in zip(gold_tree, pred_tree)) - 1
-        uas_n += len(words) - 1
-        print("\rParsing sentence #{}".format(i), end="")
-    print("")
+    test = list(trees(fp))
+predictions = parser.parse_many([words for words, _, _ in test], beam_width, workers)
+for (words, gold_tags, gold_tree), (pred_tags, pred_tree) in zip(test, predictions):
+    acc_k += sum(int(g == p) for g, p in zip(gold_tags, pred_tags)) - 1
+    acc_n += len(words) - 1
+    uas_k += sum(int(g == p) for g, p in zip(gold_tree, pred_tree)) - 1
+    uas_n += len(words) - 1
+print("Parsed {} sentences".format(len(test)))
 print("Tagging accuracy: {:.2%}".format(acc_k / acc_n))
 print("Unlabelled attachment score: {:.2%}".format(uas_k / uas_n))
@@ -0,0 +1,94 @@
+"""
+Tagging and parsing batches of sentences in a pool of worker processes.
+
+The model is handed to every worker process once, when the process starts,
+and the sentences are sent to the workers in chunks. Sentences are sorted by
+length before they are cut into chunks, so that the sentences of a chunk
+take about the same time to process, and the chunks with the longest
+sentences are submitted first, so that no worker is left with a long chunk
+at the end. The results are put back in the order of the input.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+worker_model = None
+
+def init_worker(model):
+    global worker_model
+    worker_model = model
+
+# The chunk functions use the model of the worker process, unless they are
+# given one, as they are when they are run in the calling process.
+
+def parse_chunk(sentences, beam_width, model=None):
+    model = model if model is not None else worker_model
+    return [model.parse(words, beam_width) for words in sentences]
+
+def parse_each(sentences, beam_width, model=None):
+    """
+    Parses a chunk like `parse_chunk()`, but returns a (result, error) pair
+    for every sentence, so that a sentence that cannot be parsed does not
+    fail the others.
+    """
+    model = model if model is not None else worker_model
+    results = []
+    for words in sentences:
+        try:
+            results.append((model.parse(words, beam_width), None))
+        except Exception as e:
+            results.append((None, "{}: {}".format(type(e).__name__, e)))
+    return results
+
+def tag_chunk(sentences, model=None):
+    model = model if model is not None else worker_model
+    return [model.tag(words) for words in sentences]
+
+def chunks(sentences, chunk_size):
+    """
+    Cuts the sentences into chunks of sentences of similar length, and
+    returns a list of (indices, sentences) pairs, longest sentences first.
+    """
+    order = sorted(range(len(sentences)), key=lambda k: len(sentences[k]), reverse=True)
+    result = []
+    for start in range(0, len(order), chunk_size):
+        indices = order[start:start + chunk_size]
+        result.append((indices, [sentences[k] for k in indices]))
+    return result
+
+def run(model, function, sentences, args, workers, chunk_size):
+    """
+    Applies `function` to chunks of `sentences` in a pool of `workers`
+    processes that have been initialized with `model`, and returns the
+    results in input order.
+    """
+    sentences = list(sentences)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(sentences) <= chunk_size:
+        # The model of the calling process (which a `server.Server` with one
+        # worker uses) is left alone.
+        return function(sentences, *args, model=model)
+
+    results = [None] * len(sentences)
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(model,)) as pool:
+        jobs = [(indices, pool.submit(function, chunk, *args))
+                for indices, chunk in chunks(sentences, chunk_size)]
+        for indices, job in jobs:
+            for k, result in zip(indices, job.result()):
+                results[k] = result
+    return results
+
+def parse_many(model, sentences, beam_width=1, workers=None, chunk_size=64):
+    """
+    Parses a list of sentences with `model` in `workers` processes (by
+    default, one per CPU) and returns the (tags, tree) pairs in input order.
+    """
+    return run(model, parse_chunk, sentences, (beam_width,), workers, chunk_size)
+
+def tag_many(model, sentences, workers=None, chunk_size=64):
+    """
+    Tags a list of sentences with `model` in `workers` processes (by
+    default, one per CPU) and returns the tag lists in input order.
+    """
+    return run(model, tag_chunk, sentences, (), workers, chunk_size)
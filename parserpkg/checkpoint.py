@@ -0,0 +1,62 @@
+"""
+Training checkpoints.
+
+A checkpoint holds the complete state of a parser that is being trained:
+the weights and accumulated updates of the tagger and the classifier,
+their update counts, the word frequencies and the tag dictionary. It also
+records how far training has come (the epoch and the number of sentences
+of that epoch that have been trained on), the number of workers, and the
+number of training sentences with a digest of them, so that training can
+be resumed exactly where it stopped and end with the same model as an
+uninterrupted run, and is not resumed on other data by mistake. For the
+same reason, it records the configuration of the model (see
+`configuration()`), which training cannot change.
+
+Checkpoints are pickled, and written to a temporary file that is then
+renamed, so that a crash while writing never leaves a broken checkpoint.
+"""
+
+import os
+import pickle
+
+from . import hashing as H
+from . import model_storer as S
+
+VERSION = 3
+
+def configuration(model):
+    """
+    Returns the configuration of a parser: its feature templates, and the
+    number of buckets and the signedness of its tagger and classifier
+    tables, or None for tables that are not hashed.
+    """
+    def hashing(table):
+        return (table.buckets, table.signed) if H.is_hashed(table) else None
+    return {'templates': S.templates(model), 'tagger': hashing(model.tagger.weights),
+            'classifier': hashing(model.classifier.weights)}
+
+def save_checkpoint(model, filename, epoch=0, sentence=0, workers=1, total=0, digest=None):
+    """
+    Saves the training state of `model` after `sentence` sentences of
+    epoch `epoch`, of a run over `total` sentences with the given `digest`.
+    """
+    state = {'version': VERSION, 'model': model, 'epoch': epoch,
+             'sentence': sentence, 'workers': workers, 'total': total, 'digest': digest,
+             'config': configuration(model)}
+    tmp = filename + ".tmp"
+    with open(tmp, 'wb') as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, filename)
+
+def load_checkpoint(filename):
+    """
+    Loads a checkpoint and returns a dictionary with the `model`, the
+    `epoch`, the `sentence`, the number of `workers`, the `total` number
+    of training sentences and their `digest`, and the `config` of the
+    model.
+    """
+    with open(filename, 'rb') as file:
+        state = pickle.load(file)
+    if state.get('version') != VERSION:
+        raise ValueError("unsupported checkpoint version in {}".format(filename))
+    return state
@@ -1,3 +1,6 @@
+from . import instrument as I
+from . import hashing as H
+
 class Classifier():
     """
     A multi-class perceptron classifier.
@@ -11,14 +14,16 @@ class Classifier():
 
     This implementation of a multi-class perceptron assumes that both classes
     and features can be used as dictionary keys. Feature vectors are
-    represented as lists of features.
+    represented as lists of features, which are interned to integer ids, and
+    the weights are stored in a `WeightTable` with one row of class weights
+    per feature, or, with `buckets`, in a `hashing.HashedTable` with a
+    fixed number of rows that the features are hashed to.
     
     """
-    def __init__(self):
-        self.classes = []
-        self.weights = {}
+    def __init__(self, buckets=None, signed=False):
+        self.weights = H.table(buckets, signed)
+        self.classes = self.weights.classes
 
-        self.acc = {}
         self.count = 1
 
     def predict(self, x, candidates=None):
@@ -29,49 +34,50 @@ class Classifier():
         the feature vector `x` and returns the class with the highest
         activation.
         """
-        scores = {}
-
-        occurrences = {}
-        for word in x:
-            occurrences[word] = occurrences.setdefault(word, 0) + 1
-
-        keys = self.weights.keys()
-        if candidates is not None:
-            keys = candidates
-
-        for c in keys:
-            for f in occurrences:
-                scores[c] = scores.setdefault(c, 0.0) + self.weights[c].setdefault(f, 0.0) * occurrences[f]
+        scores = self.weights.scores(self.weights.lookup(x))
 
-        key = max(scores, key = lambda c: ( scores[c], c ))
+        return self.weights.best(scores, candidates)
 
-        return key, scores[key]
+    def scores(self, x):
+        """
+        Returns a dictionary with the activations of all classes for the
+        feature vector `x`.
+        """
+        return dict(zip(self.classes, self.weights.scores(self.weights.lookup(x))))
 
     def update(self, x, y):
         """
         Updates the weight vectors with a single training example.
         """
-        if y not in self.classes:
-            self.classes.append(y)
-            self.weights[y] = {}
-            self.acc[y] = {}
+        if y not in self.weights.class_ids:
+            self.weights.add_class(y)
 
         p, s = self.predict(x)
         if p != y:
-            for f in x:
-                self.weights[p][f] = self.weights[p].setdefault(f, 0.0) - 1
-                self.acc[p][f] = self.acc[p].setdefault(f, 0.0) - self.count
-
-                self.weights[y][f] = self.weights[y].setdefault(f, 0.0) + 1
-                self.acc[y][f] = self.acc[y].setdefault(f, 0.0) + self.count
+            ids = [self.weights.intern(f) for f in x]
+            self.weights.update(ids, y, p, self.count)
         self.count += 1
 
         return p
 
+    def instrument(self, stats=None):
+        """
+        Starts recording timings and counters for this classifier, and returns
+        the `Stats` object they are recorded in.
+        """
+        self.uninstrument()
+        stats = stats if stats is not None else I.Stats()
+        I.instrument_classifier(self, stats)
+        return stats
+
+    def uninstrument(self):
+        """
+        Stops recording timings and counters.
+        """
+        I.uninstrument(self)
+
     def finalize(self):
         """
         Averages the weight vectors.
         """
-        for c in self.acc.keys():
-            for f in self.acc[c]:
-                self.weights[c][f] = self.weights[c].setdefault(f, 0.0) - self.acc[c].setdefault(f, 0.0) / self.count
+        self.weights.finalize(self.count)
@@ -0,0 +1,53 @@
+"""
+Pruning trained models.
+
+After averaging, a weight table still has a row for every feature that was
+ever looked up during training, and many of these rows are all zeros (the
+feature was interned, but its updates cancelled out) or nearly so. Pruning
+drops the features whose weights are at most a threshold in absolute value
+for every class. With a threshold of 0, only rows of zeros are dropped,
+which does not change any prediction. Pruned models can then be stored with
+quantized weights (see `model_storer.store_model()`).
+"""
+
+from array import array
+
+from . import weights as W
+from . import frozen as F
+from . import model_storer as S
+
+def prune_table(table, threshold=0.0):
+    """
+    Returns a `FrozenTable` with the features of `table` that have a weight
+    larger than `threshold` in absolute value for at least one class.
+    """
+    classes, features, weights = S.table_arrays(table)
+    if features is None:
+        raise ValueError("hashed tables cannot be pruned, as their features are not known")
+    n = len(classes)
+    kept = array('f')
+    feature_ids = {}
+    for k, f in enumerate(features):
+        row = weights[k * n:k * n + n]
+        if max(map(abs, row), default=0.0) > threshold:
+            feature_ids[f] = len(feature_ids)
+            kept.extend(row)
+    return W.FrozenTable(classes, feature_ids, kept)
+
+def prune(model, threshold=0.0):
+    """
+    Returns a frozen copy of a finalized (or frozen) parser with the weight
+    tables of its tagger and classifier pruned.
+    """
+    if not isinstance(model, F.FrozenParser):
+        model = F.freeze(model)
+    tagger = F.FrozenTagger(prune_table(model.tagger.weights, threshold),
+                            model.tagger.frequent_words, model.tagger.tag_dict, model.tagger.feature_set)
+    classifier = F.FrozenClassifier(prune_table(model.classifier.weights, threshold))
+    return F.FrozenParser(tagger, classifier, feature_set=model.feature_set)
+
+def sizes(model):
+    """
+    Returns the number of features of the tagger and of the classifier.
+    """
+    return len(model.tagger.weights.feature_ids), len(model.classifier.weights.feature_ids)
@@ -0,0 +1,221 @@
+"""
+Pre-encoded training corpora with precomputed oracle moves.
+
+Usage: python -m parserpkg.corpus CONLLU-FILE [CACHE-FILE] [--projectivize]
+
+Reading a treebank in the CoNLL-U format and running the static oracle on
+every sentence takes a good part of a training epoch. A corpus can instead
+be encoded once, in a compact binary file, and read from there in later
+training runs. The file (by default, the CoNLL-U file name with ".cache"
+appended) starts with a fixed header:
+
+    magic (8 bytes) | version (uint32) | meta size (uint64)
+
+followed by a JSON object (the meta data) with the SHA-256 hash of the
+CoNLL-U file it was made from, the number of sentences and a table of
+sections, laid out as in the model format (see `model_storer`):
+
+    words, tags                       strings (the vocabularies)
+    lengths                           uint32, words per sentence with <ROOT>
+    word_ids, tag_ids, heads          uint32, for all words of all sentences
+    moves                             uint8, 0 = SH, 1 = LA, 2 = RA
+
+An arc-standard parse of n words (with <ROOT>) takes n shifts and n - 1
+arcs, so the moves of every sentence take 2n - 1 bytes. `load()` uses the
+cache if the hash of the CoNLL-U file is the one stored in it, and
+otherwise rebuilds it. With `projectivize`, the trees of a CoNLL-U file
+that is not projective are projectivized (in parallel, see
+`formattingpkg.projectivize`) before they are encoded, which is recorded in
+the meta data.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+
+from formattingpkg.library import trees
+from formattingpkg import projectivize as PR
+from . import state as St
+from . import model_storer as S
+
+MAGIC = b"SYNCORPS"
+VERSION = 1
+HEADER = struct.Struct('<8sIQ')
+
+MOVES = ["SH", "LA", "RA"]
+MOVE_IDS = {m: k for k, m in enumerate(MOVES)}
+
+def oracle(tree):
+    """
+    Returns the moves of the static oracle (see `ParserState.gold_move()`) that
+    build the tree of a sentence, or raises ValueError if the tree cannot
+    be built by the arc-standard parser, as it is not projective.
+    """
+    n = len(tree)
+    state = St.ParserState(n, tree)
+    moves = []
+    while len(state.valid_moves()) > 0:
+        move = state.gold_move()
+        if move == "SH" and state.i == n:
+            raise ValueError("the tree {} is not projective".format(tree))
+        state.apply(move)
+        moves.append(move)
+    return moves
+
+def file_hash(file_name):
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def encode(sentences, sha256, projectivized=False):
+    """
+    Encodes (words, tags, tree) triples and returns the corpus file as bytes.
+    """
+    word_ids = {}
+    tag_ids = {}
+    lengths = array('I')
+    words_column = array('I')
+    tags_column = array('I')
+    heads = array('I')
+    moves = array('B')
+    for words, tags, tree in sentences:
+        lengths.append(len(words))
+        words_column.extend(word_ids.setdefault(w, len(word_ids)) for w in words)
+        tags_column.extend(tag_ids.setdefault(t, len(tag_ids)) for t in tags)
+        heads.extend(tree)
+        moves.extend(MOVE_IDS[m] for m in oracle(tree))
+
+    sections = [
+        ('words', S.encode_strings(word_ids)),
+        ('tags', S.encode_strings(tag_ids)),
+        ('lengths', S.little_endian(lengths)),
+        ('word_ids', S.little_endian(words_column)),
+        ('tag_ids', S.little_endian(tags_column)),
+        ('heads', S.little_endian(heads)),
+        ('moves', moves.tobytes()),
+    ]
+
+    # As in the model format, the meta data is padded until the offsets of
+    # the sections fit in it.
+    meta_size = 0
+    while True:
+        table = {}
+        offset = HEADER.size + meta_size
+        for name, data in sections:
+            table[name] = [offset, len(data)]
+            offset += len(data) + (-len(data) % 8)
+        meta = {'sha256': sha256, 'sentences': len(lengths), 'projectivized': projectivized, 'sections': table}
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        if len(meta_bytes) <= meta_size:
+            break
+        meta_size = len(meta_bytes) + 16
+        meta_size += -(HEADER.size + meta_size) % 8
+
+    body = bytearray(HEADER.pack(MAGIC, VERSION, meta_size))
+    body += meta_bytes + b' ' * (meta_size - len(meta_bytes))
+    for name, data in sections:
+        body += data
+        body += bytes(-len(data) % 8)
+    return bytes(body)
+
+class Corpus(Sequence):
+    """
+    A pre-encoded corpus, read from a memory-mapped file.
+
+    The sentences are (words, tags, tree, moves) tuples, which can be passed
+    to `Parser.update()` and to `training.train()`.
+    """
+
+    def __init__(self, file_name):
+        with open(file_name, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version > VERSION:
+            raise ValueError("{} is not a corpus file of version {} or older".format(file_name, VERSION))
+        self.meta = json.loads(bytes(data[HEADER.size:HEADER.size + meta_size]))
+
+        def section(name, typecode=None):
+            offset, size = self.meta['sections'][name]
+            view = memoryview(data)[offset:offset + size]
+            if typecode is None:
+                return S.decode_strings(view)
+            if sys.byteorder != 'little' and typecode != 'B':
+                numbers = array(typecode, view)
+                numbers.byteswap()
+                return numbers
+            return view.cast(typecode)
+
+        self.words = section('words')
+        self.tags = section('tags')
+        self.lengths = section('lengths', 'I')
+        self.word_ids = section('word_ids', 'I')
+        self.tag_ids = section('tag_ids', 'I')
+        self.heads = section('heads', 'I')
+        self.moves = section('moves', 'B')
+        self.starts = array('Q', [0])
+        for n in self.lengths:
+            self.starts.append(self.starts[-1] + n)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[j] for j in range(*k.indices(len(self)))]
+        if k < 0:
+            k += len(self)
+        start, end = self.starts[k], self.starts[k + 1]
+        words = self.words
+        tags = self.tags
+        # The moves of the sentences before this one take 2n - 1 bytes each.
+        first = 2 * start - k
+        return ([words[j] for j in self.word_ids[start:end]],
+                [tags[j] for j in self.tag_ids[start:end]],
+                list(self.heads[start:end]),
+                [MOVES[m] for m in self.moves[first:first + 2 * (end - start) - 1]])
+
+def load(file_name, cache_file=None, projectivize=False, workers=None):
+    """
+    Returns the corpus of trees in the CoNLL-U file `file_name`, read from
+    its cache file if that is up to date, and otherwise encoded and written
+    to the cache file first. If `projectivize` is true, the trees are
+    projectivized by `workers` processes before they are encoded.
+    """
+    if cache_file is None:
+        cache_file = file_name + ".cache"
+    sha256 = file_hash(file_name)
+    if os.path.isfile(cache_file):
+        try:
+            corpus = Corpus(cache_file)
+            if corpus.meta['sha256'] == sha256 and corpus.meta.get('projectivized', False) == projectivize:
+                return corpus
+        except (ValueError, KeyError, struct.error):
+            pass
+
+    if projectivize:
+        data = encode(PR.load([file_name], workers)[0], sha256, True)
+    else:
+        with open(file_name) as fp:
+            data = encode(trees(fp), sha256)
+    tmp = cache_file + ".tmp"
+    with open(tmp, 'wb') as file:
+        file.write(data)
+    os.replace(tmp, cache_file)
+    return Corpus(cache_file)
+
+def main(argv):
+    projectivize = "--projectivize" in argv
+    argv = [arg for arg in argv if arg != "--projectivize"]
+    corpus = load(argv[0], argv[1] if len(argv) > 1 else None, projectivize)
+    print("{} sentences, {} words ({} types), {} tags".format(
+        len(corpus), len(corpus.word_ids), len(corpus.words), len(corpus.tags)))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,234 @@
+"""
+Feature templates for the tagger and the parser.
+
+A feature template is a string that names one or more attributes of tokens
+at positions of the tagger or parser configuration, joined with "+", such
+as "word[s0]" (the word on top of the stack), "suffix3[b0]" (the last three
+characters of the first word in the buffer) or "tag[-1]+word[0]" (the
+previous tag and the current word, for the tagger). The template "bias"
+has no attributes and gives a feature that is always present.
+
+Positions are, for the tagger, offsets from the word being tagged (0, -1,
+1, ...; tags can only be taken from negative offsets, as they have not been
+predicted yet at the others) and, for the parser, "b0", "b1", ... (the
+words in the buffer) and "s0", "s1", ... (the words on the stack, topmost
+first). A position outside of the sentence, the buffer or the stack has the
+token "<BOS>" (for negative offsets), "<EOS>" (for positive offsets or the
+buffer) or "<EMPTY>" (for the stack). The attributes of a token are:
+
+    word        the word itself
+    tag         its (predicted) part-of-speech tag
+    lower       the word in lower case
+    prefixN     the first N characters of the word (N = 1 to 9)
+    suffixN     the last N characters of the word (N = 1 to 9)
+    shape       the word with letters mapped to X or x and digits to d
+    upper       Y if the word starts with an upper case letter, N if not
+    digits      Y if the word contains a digit, N if not
+    long        Y if the word is longer than 3 characters, N if not
+    frequent    Y if the word is frequent (see `Tagger.is_frequent()`), N if
+                not; for the tagger only
+
+A list of templates is compiled into Python functions that extract the
+features of a configuration with no other work than indexing and string
+concatenation. Duplicate templates (including templates that combine the
+same attributes in another order) are dropped, as are repeated attributes
+within a template. A feature is the position of its template in the list,
+"=" and the values of the attributes, separated by tabs, which cannot occur
+in tokens.
+"""
+
+import re
+
+# The default templates. They cover the information in the features of the
+# first versions of the tagger and the parser, without their duplicates.
+TAGGER_TEMPLATES = [
+    "bias", "word[0]", "prefix1[0]", "prefix2[0]", "prefix3[0]",
+    "suffix1[0]", "suffix2[0]", "suffix3[0]", "long[0]", "digits[0]", "frequent[0]", "upper[0]",
+    "tag[-1]+word[0]", "tag[-2]+word[0]", "tag[-1]+word[-1]", "tag[-1]+word[1]",
+    "word[0]+word[1]", "word[-1]+word[0]", "word[1]", "word[-1]+word[1]",
+]
+
+PARSER_TEMPLATES = [
+    "word[b0]", "tag[b0]", "word[s0]", "tag[s0]", "word[s1]", "tag[s1]",
+]
+
+ATOM = re.compile(r"^([a-z]+?)([1-9]?)\[([^\]]+)\]$")
+
+ATTRIBUTES = {
+    'word': "{}",
+    'tag': "{}",
+    'lower': "{}.lower()",
+    'prefix': "{}[:{n}]",
+    'suffix': "{}[-{n}:]",
+    'shape': "shape({})",
+    'upper': "('Y' if {}[:1].isupper() else 'N')",
+    'digits': "('Y' if has_digits({}) else 'N')",
+    'long': "('Y' if len({}) > 3 else 'N')",
+    'frequent': "('Y' if is_frequent({}) else 'N')",
+}
+
+def shape(word):
+    return "".join("X" if c.isupper() else "x" if c.isalpha() else "d" if c.isdigit() else c for c in word)
+
+def has_digits(word):
+    return any(c.isdigit() for c in word)
+
+def parse(template, positions):
+    """
+    Parses a template into a sorted tuple of (attribute, N, position) atoms,
+    without repetitions. `positions(p)` checks and normalizes a position.
+    """
+    template = template.strip()
+    if template == "bias":
+        return ()
+    atoms = set()
+    for part in template.split("+"):
+        match = ATOM.match(part.strip())
+        if match is None or match.group(1) not in ATTRIBUTES:
+            raise ValueError("invalid feature template {!r}".format(template))
+        attribute, n, position = match.group(1), match.group(2), match.group(3)
+        if (attribute in ('prefix', 'suffix')) != (n != ""):
+            raise ValueError("invalid feature template {!r}".format(template))
+        atoms.add((attribute, int(n or 0), positions(attribute, position)))
+    return tuple(sorted(atoms))
+
+def dedupe(templates, positions):
+    """
+    Returns the templates without duplicates, with their parsed atoms.
+    """
+    seen = set()
+    result = []
+    for template in templates:
+        atoms = parse(template, positions)
+        if atoms not in seen:
+            seen.add(atoms)
+            result.append((template.strip(), atoms))
+    return result
+
+def values(k, atoms, token):
+    """
+    Returns the expression of the feature of template `k` with `atoms`,
+    where `token(attribute, position)` is the name of the variable that
+    holds the token at a position.
+    """
+    parts = ["'{}='".format(k)]
+    for n, (attribute, size, position) in enumerate(atoms):
+        if n > 0:
+            parts.append("'\\t'")
+        parts.append(ATTRIBUTES[attribute].format(token(attribute, position), n=size))
+    return " + ".join(parts)
+
+def build(name, arguments, lines, expressions, namespace):
+    source = "def {}({}):\n".format(name, ", ".join(arguments))
+    source += "".join("    " + line + "\n" for line in lines)
+    source += "    return [{}]\n".format(", ".join(expressions))
+    env = dict(namespace)
+    exec(compile(source, "<{} features>".format(name), "exec"), env)
+    return env[name]
+
+class TaggerFeatures():
+    """
+    The compiled feature templates of a tagger.
+
+    `static(word, is_frequent)` returns the features of the templates that
+    only look at the word being tagged, which can be cached per word, and
+    `context(words, i, tags, is_frequent)` those of the other templates.
+    `static_templates` and `context_templates` are these templates, in the
+    order of their features.
+    """
+
+    def __init__(self, templates=None):
+        parsed = dedupe(TAGGER_TEMPLATES if templates is None else templates, self.position)
+        self.templates = [template for template, _ in parsed]
+        static = []
+        context = []
+        self.static_templates = []
+        self.context_templates = []
+        used = set()
+        for k, (template, atoms) in enumerate(parsed):
+            if all(position == 0 and attribute != 'tag' for attribute, _, position in atoms):
+                static.append(values(k, atoms, lambda attribute, position: "word"))
+                self.static_templates.append(template)
+            else:
+                context.append(values(k, atoms, self.token))
+                self.context_templates.append(template)
+                used.update(atoms)
+        lines = ["n = len(words)"]
+        for attribute, _, position in sorted(used):
+            name = self.token(attribute, position)
+            if attribute == 'tag':
+                line = "{} = tags[i - {}] if i >= {} else '<BOS>'".format(name, -position, -position)
+            elif position < 0:
+                line = "{} = words[i - {}] if i >= {} else '<BOS>'".format(name, -position, -position)
+            elif position > 0:
+                line = "{} = words[i + {}] if i + {} < n else '<EOS>'".format(name, position, position)
+            else:
+                line = "{} = words[i]".format(name)
+            if line not in lines:
+                lines.append(line)
+        namespace = {'shape': shape, 'has_digits': has_digits}
+        self.static = build("static", ["word", "is_frequent"], [], static, namespace)
+        self.context = build("context", ["words", "i", "tags", "is_frequent"], lines, context, namespace)
+
+    def __reduce__(self):
+        return (TaggerFeatures, (self.templates,))
+
+    @staticmethod
+    def position(attribute, position):
+        try:
+            offset = int(position)
+        except ValueError:
+            raise ValueError("invalid tagger position {!r}".format(position))
+        if attribute == 'tag' and offset >= 0:
+            raise ValueError("tags are only known at negative offsets, not at {}".format(offset))
+        return offset
+
+    @staticmethod
+    def token(attribute, position):
+        kind = "t" if attribute == 'tag' else "w"
+        return "{}{}{}".format(kind, "m" if position < 0 else "p", abs(position))
+
+class ParserFeatures():
+    """
+    The compiled feature templates of a parser: `extract(words, tags, i,
+    stack)` returns the features of a configuration. `stack_depth` is the
+    number of words from the top of the stack that the templates look at.
+    """
+
+    def __init__(self, templates=None):
+        parsed = dedupe(PARSER_TEMPLATES if templates is None else templates, self.position)
+        self.templates = [template for template, _ in parsed]
+        used = {atom for _, atoms in parsed for atom in atoms}
+        self.stack_depth = max((int(position[1:]) + 1 for _, _, position in used if position[0] == "s"), default=0)
+        lines = ["n = len(words)"]
+        for position in sorted({position for _, _, position in used}):
+            k = int(position[1:])
+            if position[0] == "b":
+                lines.append("i{0} = i + {1} if i + {1} < n else -1".format(position, k))
+            else:
+                lines.append("i{0} = stack[-{1}] if len(stack) > {2} else -1".format(position, k + 1, k))
+        for attribute, _, position in sorted(used):
+            default = "<EOS>" if position[0] == "b" else "<EMPTY>"
+            source = "tags" if attribute == 'tag' else "words"
+            line = "{} = {}[i{}] if i{} >= 0 else '{}'".format(
+                self.token(attribute, position), source, position, position, default)
+            if line not in lines:
+                lines.append(line)
+        expressions = [values(k, atoms, self.token) for k, (_, atoms) in enumerate(parsed)]
+        self.extract = build("extract", ["words", "tags", "i", "stack"], lines, expressions,
+                             {'shape': shape, 'has_digits': has_digits})
+
+    def __reduce__(self):
+        return (ParserFeatures, (self.templates,))
+
+    @staticmethod
+    def position(attribute, position):
+        if attribute == 'frequent':
+            raise ValueError("the parser has no word frequencies")
+        if re.match(r"^[bs][0-9]$", position) is None:
+            raise ValueError("invalid parser position {!r}".format(position))
+        return position
+
+    @staticmethod
+    def token(attribute, position):
+        return ("t" if attribute == 'tag' else "w") + position
@@ -0,0 +1,92 @@
+from . import parser as P
+from . import tagger as T
+from . import classifier as C
+
+class FrozenTagger(T.Tagger):
+    """
+    A part-of-speech tagger with read-only weights, for inference only.
+
+    Instead of the word frequencies collected during training, this tagger
+    only keeps the set of words that count as frequent for its features,
+    and the tag dictionary entries of the words that were seen often enough
+    to be used.
+    """
+
+    def __init__(self, weights, frequent_words, tag_dict=None, feature_set=None):
+        self.feature_set = feature_set
+        self.weights = weights
+        self.tags = weights.classes
+        self.frequent_words = frozenset(frequent_words)
+        self.tag_dict = {w: tuple(sorted(tags)) for w, tags in (tag_dict or {}).items()}
+        self.use_tag_dict = True
+        self.set_cache(T.CACHE_SIZE)
+
+    def is_frequent(self, word):
+        return word in self.frequent_words
+
+    def candidates(self, word):
+        return self.tag_dict.get(word)
+
+    def update(self, words, gold_tags):
+        raise TypeError("a frozen tagger cannot be trained")
+
+    def finalize(self):
+        raise TypeError("a frozen tagger cannot be trained")
+
+class FrozenClassifier(C.Classifier):
+    """
+    A multi-class perceptron classifier with read-only weights.
+    """
+
+    def __init__(self, weights):
+        self.weights = weights
+        self.classes = weights.classes
+
+    def update(self, x, y):
+        raise TypeError("a frozen classifier cannot be trained")
+
+    def finalize(self):
+        raise TypeError("a frozen classifier cannot be trained")
+
+class FrozenParser(P.Parser):
+    """
+    A transition-based dependency parser for inference only.
+
+    A frozen parser parses exactly like the `Parser` it was built from, but
+    its weight tables are immutable and it keeps no training state, so its
+    memory use stays the same however much text it parses.
+    """
+
+    def __init__(self, tagger, classifier, source=None, checksum=None, shared=False, feature_set=None):
+        self.feature_set = feature_set
+        self.tagger = tagger
+        self.classifier = classifier
+        self.source = source
+        self.checksum = checksum
+        self.shared = shared
+
+    def __reduce__(self):
+        # A model that was read from a file is pickled by its file name, so
+        # that a worker process maps the same file instead of receiving a
+        # copy of the weights.
+        if self.source is not None:
+            from . import model_storer as S
+            return (S.read_model, (self.source, True, True, self.shared))
+        return (FrozenParser, (self.tagger, self.classifier, None, self.checksum, False, self.feature_set))
+
+    def update(self, words, gold_tags, gold_tree):
+        raise TypeError("a frozen parser cannot be trained")
+
+    def finalize(self):
+        raise TypeError("a frozen parser cannot be trained")
+
+def freeze(model):
+    """
+    Returns a frozen copy of a finalized parser.
+    """
+    frequent_words = [w for w in model.tagger.words_freq if model.tagger.is_frequent(w)]
+    tag_dict = {w: tags for w, tags in model.tagger.tag_dict.items()
+                if model.tagger.candidates(w) is not None}
+    tagger = FrozenTagger(model.tagger.weights.freeze(), frequent_words, tag_dict, model.tagger.feature_set)
+    classifier = FrozenClassifier(model.classifier.weights.freeze())
+    return FrozenParser(tagger, classifier, feature_set=model.feature_set)
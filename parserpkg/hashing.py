@@ -0,0 +1,211 @@
+"""
+Hashed feature spaces.
+
+The weight tables of the tagger and the classifier normally give every
+distinct feature string its own row, so their size grows with the training
+data, mostly through the long tail of lexical features that are seen only
+once or twice. With feature hashing, a feature string is instead mapped by
+a hash function to one of a fixed number of buckets, and the row of the
+bucket is used as its weights. Features that fall into the same bucket
+share their weights, which costs some accuracy when there are too few
+buckets, but the memory of a table is fixed in advance (buckets times
+classes weights), and no dict of feature strings is kept at all, neither
+during training nor in a stored model.
+
+The hash function is CRC-32 of the UTF-8 encoding of a feature, which does
+not depend on the process (unlike the built-in `hash()` of strings). With
+signed hashing, another bit of the hash decides whether a feature adds or
+subtracts the weights of its bucket, so that the collisions of a bucket
+tend to cancel out instead of adding up. The id of a feature is then the
+bucket `k` for a positive sign and `~k` (that is, -k - 1) for a negative
+one.
+"""
+
+from array import array
+from itertools import repeat
+from operator import add, mul
+from zlib import crc32
+
+from . import weights as W
+
+SIGN = 1 << 31
+
+class FeatureHash():
+    """
+    Maps feature strings to the ids of their buckets, in place of the dict
+    of feature ids of a weight table. Every feature is known.
+    """
+
+    def __init__(self, buckets, signed=False):
+        if buckets < 1 or buckets > SIGN:
+            raise ValueError("the number of buckets must be between 1 and {}".format(SIGN))
+        self.buckets = buckets
+        self.signed = signed
+
+    def __getitem__(self, f):
+        h = crc32(f.encode('utf-8'))
+        k = h % self.buckets
+        return ~k if self.signed and h & SIGN else k
+
+    def get(self, f, default=None):
+        return self[f]
+
+    def __contains__(self, f):
+        return True
+
+    def __len__(self):
+        return self.buckets
+
+    def lookup(self, x):
+        """
+        Returns the ids of the features in the feature vector `x`.
+        """
+        buckets = self.buckets
+        if self.signed:
+            return [~(h % buckets) if h & SIGN else h % buckets for h in (crc32(f.encode('utf-8')) for f in x)]
+        return [crc32(f.encode('utf-8')) % buckets for f in x]
+
+def signed_scores(w, n, ids, base=None, scales=None):
+    """
+    Returns the activations of all classes for a list of signed bucket ids,
+    with the weights of the buckets in the flat buffer `w` of `n` classes.
+    """
+    plus = [w[k * n:k * n + n] for k in ids if k >= 0]
+    minus = [w[~k * n:~k * n + n] for k in ids if k < 0]
+    totals = [0.0] * n
+    if len(plus) > 0:
+        totals = list(map(sum, zip(*plus)))
+    if len(minus) > 0:
+        totals = [t - s for t, s in zip(totals, map(sum, zip(*minus)))]
+    if scales is not None:
+        totals = list(map(mul, totals, scales))
+    if base is not None:
+        totals = list(map(add, totals, base))
+    return totals
+
+class HashedTable(W.WeightTable):
+    """
+    A `WeightTable` with a fixed number of rows, one per bucket, that
+    features are hashed to.
+    """
+
+    def __init__(self, buckets, signed=False):
+        super().__init__()
+        self.feature_ids = FeatureHash(buckets, signed)
+
+    @property
+    def buckets(self):
+        return self.feature_ids.buckets
+
+    @property
+    def signed(self):
+        return self.feature_ids.signed
+
+    def intern(self, f):
+        return self.feature_ids[f]
+
+    def lookup(self, x):
+        return self.feature_ids.lookup(x)
+
+    def scores(self, ids, base=None):
+        if self.signed:
+            return signed_scores(self.weights, len(self.classes), ids, base)
+        return super().scores(ids, base)
+
+    def update(self, ids, y, p, count):
+        if not self.signed:
+            return super().update(ids, y, p, count)
+        n = len(self.classes)
+        yi = self.class_ids[y]
+        pi = self.class_ids[p]
+        w = self.weights
+        acc = self.acc
+        for k in ids:
+            if k < 0:
+                b = ~k * n
+                w[b + pi] += 1
+                acc[b + pi] += count
+                w[b + yi] -= 1
+                acc[b + yi] -= count
+            else:
+                b = k * n
+                w[b + pi] -= 1
+                acc[b + pi] -= count
+                w[b + yi] += 1
+                acc[b + yi] += count
+
+    def freeze(self):
+        return FrozenHashedTable(self.classes, self.buckets, self.signed, array('d', self.weights))
+
+    def to_dict(self):
+        raise TypeError("the features of a hashed table are not known")
+
+    @classmethod
+    def mix(cls, tables, mixture):
+        """
+        Returns the weighted average of a list of tables with the same
+        number of buckets, as `WeightTable.mix()`.
+        """
+        table = cls(tables[0].buckets, tables[0].signed)
+        for t in tables:
+            for c in t.classes:
+                if c not in table.class_ids:
+                    table.add_class(c)
+        n = len(table.classes)
+        for t, mu in zip(tables, mixture):
+            if t.classes == table.classes:
+                weights = t.weights
+            else:
+                # Lay out the weights of the table with the classes of the
+                # result, with zeros for the classes it does not have.
+                weights = array('d', bytes(8 * table.buckets * n))
+                for j, c in enumerate(t.classes):
+                    weights[table.class_ids[c]::n] = t.weights[j::len(t.classes)]
+            table.weights = array('d', map(add, table.weights, map(mul, weights, repeat(mu))))
+        return table
+
+    @classmethod
+    def from_weights(cls, classes, buckets, signed, weights):
+        """
+        Builds a table from the flat weights of a stored table.
+        """
+        table = cls(buckets, signed)
+        for c in classes:
+            table.add_class(c)
+        table.weights = array('d', weights)
+        return table
+
+class FrozenHashedTable(W.FrozenTable):
+    """
+    A read-only `HashedTable` for inference.
+    """
+
+    def __init__(self, classes, buckets, signed, weights, scales=None):
+        super().__init__(classes, FeatureHash(buckets, signed), weights, scales)
+
+    def __reduce__(self):
+        return (FrozenHashedTable, (self.classes, self.feature_ids.buckets, self.feature_ids.signed,
+                                    array(self.weights.format, self.weights), self.scales))
+
+    def lookup(self, x):
+        return self.feature_ids.lookup(x)
+
+    def scores(self, ids, base=None):
+        if self.feature_ids.signed:
+            return signed_scores(self.weights, self.n, ids, base, self.scales)
+        return super().scores(ids, base)
+
+    def to_dict(self):
+        raise TypeError("the features of a hashed table are not known")
+
+def table(buckets=None, signed=False):
+    """
+    Returns a new, empty weight table: a `HashedTable` with `buckets` rows,
+    or a `WeightTable` if `buckets` is None.
+    """
+    if buckets is None:
+        return W.WeightTable()
+    return HashedTable(buckets, signed)
+
+def is_hashed(table):
+    return isinstance(table.feature_ids, FeatureHash)
@@ -0,0 +1,188 @@
+"""
+Opt-in profiling of the stages of tagging and parsing.
+
+Instrumenting a parser, tagger or classifier replaces some of its methods,
+on that object only, with wrappers that record the time spent in them and
+the number of calls. An object that is not instrumented runs the original
+methods, so the instrumentation costs nothing when it is disabled. The
+stages are:
+
+    parse             Parser.parse, the whole sentence
+    tag               Tagger.tag, the whole sentence
+    tagger_features   Tagger.static_features and Tagger.context_features
+    tagger_scoring    Tagger.predict and Tagger.predict_cached
+    decode            Parser.parse_greedy and Parser.parse_beam
+    parser_features   Parser.features
+    scoring           Classifier.scores and Classifier.predict
+
+Stages are nested: `parse` includes `tag` and `decode`, `decode` includes
+`parser_features` and `scoring`, and what remains of `decode` after those
+two (the moves, valid-move checks and beam management) is reported as
+`transitions`. Likewise, `tag` includes `tagger_features` and
+`tagger_scoring`, and `tagger_scoring` includes the features that
+`predict_cached` extracts. The statistics also include a histogram of
+sentence lengths and, for every feature template, how many lookups of it
+missed the weight table. Templates are named by their template string (see
+the `features` module), or, for models with the original, hand-written
+features, by the position of their feature in the feature vector.
+
+Instrumented objects cannot be pickled, so they should be instrumented in
+the process that uses them.
+"""
+
+import json
+import threading
+import time
+
+class Stats():
+    """
+    Cumulative timings, call counts and counters of instrumented objects.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.lengths = {}
+        self.lookups = {}
+        self.misses = {}
+        self.dumper = None
+
+    def record(self, stage, elapsed):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def timed(self, stage, function):
+        """
+        Returns a wrapper of `function` that records its time under `stage`.
+        """
+        clock = time.perf_counter
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(stage, clock() - start)
+        return wrapper
+
+    def sentence(self, function):
+        """
+        Returns a wrapper of `function` that takes a sentence as its first
+        argument and records the length of the sentence.
+        """
+        def wrapper(words, *args, **kwargs):
+            bucket = (len(words) - 1) // 10 * 10
+            self.lengths[bucket] = self.lengths.get(bucket, 0) + 1
+            return function(words, *args, **kwargs)
+        return wrapper
+
+    def templates(self, name, function, table, names=lambda: None):
+        """
+        Returns a wrapper of a feature extraction function that counts, for
+        every template of the returned feature vector, how many features
+        are looked up and how many of them are not in the weight table.
+        The templates are named by `names()`, the template strings in the
+        order of the features, or by their positions if it returns None.
+        """
+        def wrapper(*args, **kwargs):
+            features = function(*args, **kwargs)
+            ids = table().feature_ids
+            templates = names()
+            for k, f in enumerate(features):
+                key = name + ":" + (templates[k] if templates is not None else str(k))
+                self.lookups[key] = self.lookups.get(key, 0) + 1
+                if f not in ids:
+                    self.misses[key] = self.misses.get(key, 0) + 1
+            return features
+        return wrapper
+
+    def as_dict(self):
+        """
+        Returns the statistics as a dictionary that can be dumped as JSON.
+        """
+        seconds = dict(self.seconds)
+        calls = dict(self.calls)
+        stages = {stage: {'calls': calls.get(stage, 0), 'seconds': s,
+                          'mean_us': s / calls[stage] * 1e6 if calls.get(stage) else 0.0}
+                  for stage, s in seconds.items()}
+        if 'decode' in seconds:
+            rest = seconds['decode'] - seconds.get('parser_features', 0.0) - seconds.get('scoring', 0.0)
+            stages['transitions'] = {'calls': calls['decode'], 'seconds': rest,
+                                     'mean_us': rest / calls['decode'] * 1e6}
+        lookups = dict(self.lookups)
+        misses = dict(self.misses)
+        templates = {key: {'lookups': n, 'misses': misses.get(key, 0),
+                           'miss_rate': misses.get(key, 0) / n}
+                     for key, n in lookups.items()}
+        lengths = {"{}-{}".format(b, b + 9): n for b, n in sorted(self.lengths.items())}
+        return {'stages': stages, 'sentence_lengths': lengths, 'templates': templates}
+
+    def reset(self):
+        self.seconds.clear()
+        self.calls.clear()
+        self.lengths.clear()
+        self.lookups.clear()
+        self.misses.clear()
+
+    def dump(self, fp):
+        """
+        Writes the statistics as one line of JSON, with a timestamp.
+        """
+        record = self.as_dict()
+        record['time'] = time.time()
+        fp.write(json.dumps(record) + "\n")
+        fp.flush()
+
+    def start_dumping(self, fp, interval):
+        """
+        Starts a background thread that dumps the statistics to `fp` every
+        `interval` seconds, until `stop_dumping()` is called.
+        """
+        self.stop_dumping()
+        stop = threading.Event()
+        def run():
+            while not stop.wait(interval):
+                self.dump(fp)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.dumper = (thread, stop)
+
+    def stop_dumping(self):
+        if self.dumper is not None:
+            thread, stop = self.dumper
+            stop.set()
+            thread.join()
+            self.dumper = None
+
+INSTRUMENTED = ['parse', 'parse_greedy', 'parse_beam', 'features', 'tag',
+                'static_features', 'context_features', 'predict', 'predict_cached', 'scores']
+
+def instrument_parser(parser, stats):
+    parser.parse = stats.timed('parse', stats.sentence(parser.parse))
+    parser.parse_greedy = stats.timed('decode', parser.parse_greedy)
+    parser.parse_beam = stats.timed('decode', parser.parse_beam)
+    names = lambda: parser.feature_set.templates if parser.feature_set is not None else None
+    parser.features = stats.timed('parser_features',
+                                  stats.templates('parser', parser.features, lambda: parser.classifier.weights, names))
+
+def instrument_tagger(tagger, stats):
+    tagger.tag = stats.timed('tag', tagger.tag)
+    table = lambda: tagger.weights
+    static = lambda: tagger.feature_set.static_templates if tagger.feature_set is not None else None
+    context = lambda: tagger.feature_set.context_templates if tagger.feature_set is not None else None
+    tagger.static_features = stats.timed('tagger_features',
+                                         stats.templates('tagger_static', tagger.static_features, table, static))
+    tagger.context_features = stats.timed('tagger_features',
+                                          stats.templates('tagger_context', tagger.context_features, table, context))
+    tagger.predict = stats.timed('tagger_scoring', tagger.predict)
+    tagger.predict_cached = stats.timed('tagger_scoring', tagger.predict_cached)
+
+def instrument_classifier(classifier, stats):
+    classifier.scores = stats.timed('scoring', classifier.scores)
+    classifier.predict = stats.timed('scoring', classifier.predict)
+
+def uninstrument(obj):
+    """
+    Restores the original methods of an instrumented object.
+    """
+    for name in INSTRUMENTED:
+        obj.__dict__.pop(name, None)
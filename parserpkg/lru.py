@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+class LRUCache():
+    """
+    A dictionary with a bounded number of entries.
+
+    When the cache is full, adding an entry evicts the least recently used
+    one. The cache can also be bounded by the total size of its entries, as
+    given by the function `sizeof(key, value)`. The cache counts how often
+    a lookup finds an entry (a hit) and how often it does not (a miss).
+    """
+
+    def __init__(self, maxsize, max_bytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """
+        Returns the value for `key`, or `default` if it is not cached.
+        """
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Adds an entry, evicting the least recently used ones if necessary.
+        """
+        if self.max_bytes is not None:
+            if key in self.entries:
+                self.bytes -= self.sizeof(key, self.entries[key])
+            self.bytes += self.sizeof(key, value)
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            old_key, old_value = self.entries.popitem(last=False)
+            if self.max_bytes is not None:
+                self.bytes -= self.sizeof(old_key, old_value)
+
+    def clear(self):
+        """
+        Removes all entries (but keeps the counts).
+        """
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        """
+        Returns the size, hits, misses and hit rate of the cache.
+        """
+        lookups = self.hits + self.misses
+        stats = {'size': len(self.entries), 'maxsize': self.maxsize,
+                 'hits': self.hits, 'misses': self.misses,
+                 'hit_rate': self.hits / lookups if lookups > 0 else 0.0}
+        if self.max_bytes is not None:
+            stats['bytes'] = self.bytes
+            stats['max_bytes'] = self.max_bytes
+        return stats
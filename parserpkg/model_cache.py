@@ -0,0 +1,140 @@
+"""
+A cache of trained models, keyed by the content of the training data.
+
+A model is stored in the cache directory under a key that is the SHA-256
+hash of the training file together with the training configuration (the
+options given by the caller, the feature templates and the constants of the
+tagger), so that a model is reused only if training would produce the same
+model again, and an edited corpus or a changed option trains a new one.
+
+The cache is safe to use from several processes at once. Models are
+written to a temporary file that is then renamed, so a model in the cache
+is always complete, and a process that is about to train a model holds a
+lock on its key, so that other processes that need the same model wait for
+it instead of training it as well. When there are more than `max_entries`
+models in the cache, the least recently used ones are deleted.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from . import model_storer as S
+from . import features as FE
+from . import tagger as T
+from . import corpus as CO
+
+def default_directory():
+    return os.environ.get("SYNPARSE_CACHE",
+                          os.path.join(os.path.expanduser("~"), ".cache", "syntacticparser"))
+
+class ModelCache():
+    """
+    Trained models in a directory, by the hash of their training data and
+    configuration.
+    """
+
+    def __init__(self, directory=None, max_entries=8):
+        self.directory = directory if directory is not None else default_directory()
+        self.max_entries = max_entries
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, train_file, config=None):
+        """
+        Returns the key of the model trained on `train_file` with `config`,
+        a dictionary of options that can be dumped as JSON.
+        """
+        settings = {'config': config or {}, 'format': S.VERSION,
+                    'templates': {'parser': FE.PARSER_TEMPLATES, 'tagger': FE.TAGGER_TEMPLATES},
+                    'tagger': {'frequent': T.FREQUENT, 'tagdict_freq': T.TAGDICT_FREQ}}
+        digest = hashlib.sha256(CO.file_hash(train_file).encode('ascii'))
+        digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+    def get(self, train_file, config, train, frozen=True):
+        """
+        Returns the model trained on `train_file` with `config` from the
+        cache, or trains it with `train()`, which should return a finalized
+        parser, and adds it to the cache first.
+        """
+        key = self.key(train_file, config)
+        path = self.path(key)
+        while True:
+            if not os.path.isfile(path):
+                self.train(path, key, train)
+            try:
+                # The modification time of a model is the time it was last
+                # used.
+                now = time.time()
+                os.utime(path, (now, now))
+                return S.read_model(path, frozen)
+            except FileNotFoundError:
+                # Another process evicted the model in the meantime.
+                continue
+
+    def train(self, path, key, train):
+        with open(os.path.join(self.directory, key + ".lock"), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Another process may have trained the model while this one
+                # was waiting for the lock.
+                if not os.path.isfile(path):
+                    tmp = "{}.{}.tmp".format(path, os.getpid())
+                    try:
+                        S.store_model(train(), tmp)
+                    except BaseException:
+                        # A model that failed to store is never cached.
+                        if os.path.exists(tmp):
+                            os.remove(tmp)
+                        raise
+                    os.replace(tmp, path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        self.evict(keep=path)
+
+    def entries(self):
+        """
+        Returns the paths of the models in the cache, most recently used
+        first.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".bin"):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except FileNotFoundError:
+                    pass
+        return [path for _, path in sorted(entries, reverse=True)]
+
+    def evict(self, keep=None):
+        """
+        Deletes the least recently used models beyond `max_entries`, and
+        their lock files.
+        """
+        others = [path for path in self.entries() if path != keep]
+        for path in others[max(0, self.max_entries - (keep is not None)):]:
+            for name in (path, path[:-len(".bin")] + ".lock"):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
+
+    def clear(self):
+        """
+        Deletes all models in the cache.
+        """
+        self.max_entries, max_entries = 0, self.max_entries
+        self.evict()
+        self.max_entries = max_entries
@@ -1,34 +1,400 @@
+"""
+Storing and reading parser models.
+
+Models are stored in a compact binary format that can be memory-mapped, so
+that loading a model does not require reading and decoding all of it, and
+several processes that load the same model share its weights in memory.
+A file in this format starts with a fixed header:
+
+    magic (8 bytes) | version (uint32) | checksum (uint32) | meta size (uint64)
+
+The header is followed by a JSON object (the meta data) with the classes of
+the classifier and the tagger and a table of sections, giving the offset and
+size of every section. Sections are aligned to 8 bytes and hold either a
+list of strings, separated by newlines and encoded in UTF-8, or a
+little-endian array of numbers:
+
+    classifier/features, tagger/features, tagger/words   strings
+    classifier/weights, tagger/weights                   float32, float16 or int8
+    classifier/scales, tagger/scales                     float32 (int8 only)
+    tagger/counts                                        uint32
+    tagger/tagdict                                       strings
+    classifier/offsets, tagger/offsets                   uint32
+    classifier/index, tagger/index                       uint32
+
+The weights of a table are stored feature after feature, with one cell per
+class, as float32 unless the meta data gives another `dtype` for the table.
+Float16 weights halve the size of the file and are converted to float32
+when the model is read. Int8 weights are quantized with a scale per class
+(the largest absolute weight of the class divided by 127), stored in the
+scales section, and are used as they are, so that they also take a quarter
+of the memory; files with quantized weights have version 2.
+
+Every line of the tag dictionary holds a word followed by the tags that it
+may be given, separated by tabs; only the entries that the tagger uses (see
+`Tagger.candidates()`) are stored, and files without this section are read
+with an empty tag dictionary. The offsets and the index of a table are the
+byte offsets of its features and a hash table of their ids (see the `vocab`
+module), with which a model can be read without building a dict of its
+features; files without them can still be read, but not in that way. The
+checksum is the CRC-32 of everything after the header.
+
+The meta data also holds the feature templates of the tagger and the parser
+(see the `features` module). Models stored before templates existed have
+none, and are read with the original, hand-written features. As a reader
+that does not know templates would read a model with templates in that
+way, and predict with the wrong features, files with templates have
+version 3.
+
+The weights of a hashed table (see the `hashing` module) are stored one
+bucket after the other, and the table has no features, offsets or index
+sections; its number of buckets and whether it uses signed hashing are
+given in `hashing` in the meta data. Files with hashed tables have version
+4.
+
+The older JSON format, with nested dictionaries of weights, is still
+available through `export_json()` and `import_json()`.
+"""
+
 import json
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+
 from . import parser as P
+from . import tagger as T
+from . import weights as W
+from . import frozen as F
+from . import vocab as V
+from . import features as FE
+from . import hashing as H
+
+MAGIC = b"SYNPARSE"
+VERSION = 4
+DTYPES = {'f32': 'f', 'f16': 'e', 'i8': 'b'}
+HEADER = struct.Struct('<8sIIQ')
+
+def table_arrays(table):
+    """
+    Returns the classes, the features (in order of their ids, or None for a
+    hashed table) and the flat float32 weights of a `WeightTable` or a
+    `FrozenTable`.
+    """
+    ids = table.feature_ids
+    features = None if H.is_hashed(table) else sorted(ids, key=ids.get)
+    if isinstance(table, W.WeightTable):
+        weights = array('f', table.weights)
+    elif table.scales is not None:
+        n = table.n
+        weights = array('f', (w * table.scales[k % n] for k, w in enumerate(table.weights)))
+    else:
+        weights = array('f', table.weights)
+    return list(table.classes), features, weights
+
+def templates(model):
+    """
+    Returns the feature templates of the parser and the tagger of a model,
+    with None for the original features.
+    """
+    return {'parser': model.feature_set.templates if model.feature_set is not None else None,
+            'tagger': model.tagger.feature_set.templates if model.tagger.feature_set is not None else None}
+
+def feature_sets(meta):
+    """
+    Returns the compiled feature templates of the parser and the tagger
+    stored in the meta data of a model.
+    """
+    stored = meta.get('templates') or {}
+    parser = FE.ParserFeatures(stored['parser']) if stored.get('parser') is not None else None
+    tagger = FE.TaggerFeatures(stored['tagger']) if stored.get('tagger') is not None else None
+    return parser, tagger
+
+def set_feature_sets(model, meta):
+    model.feature_set, model.tagger.feature_set = feature_sets(meta)
+
+def quantize(weights, n):
+    """
+    Quantizes flat float32 weights with `n` classes to int8, and returns
+    the int8 array and the scale of every class.
+    """
+    scales = [max((abs(w) for w in weights[j::n]), default=0.0) / 127 or 1.0 for j in range(n)]
+    return array('b', (round(w / scales[k % n]) for k, w in enumerate(weights))), scales
+
+def encode_weights(weights, n, dtype):
+    """
+    Encodes flat float32 weights as `dtype`, and returns the data of the
+    weights section and of the scales section (None unless quantized).
+    """
+    if dtype == 'f16':
+        return struct.pack('<{}e'.format(len(weights)), *weights), None
+    if dtype == 'i8':
+        quantized, scales = quantize(weights, n)
+        return quantized.tobytes(), little_endian(array('f', scales))
+    return little_endian(weights), None
+
+def words_counts(tagger):
+    """
+    Returns the word frequencies of a tagger as a list of words and an array
+    of counts. A frozen tagger only knows which words are frequent, so those
+    are given the smallest count that makes a word frequent.
+    """
+    if isinstance(tagger, F.FrozenTagger):
+        words = sorted(tagger.frequent_words)
+        return words, array('I', [T.FREQUENT + 1] * len(words))
+    words = list(tagger.words_freq)
+    return words, array('I', (tagger.words_freq[w] for w in words))
+
+def tag_dict_lines(tagger):
+    """
+    Returns the tag dictionary entries that a tagger uses, as lines of a
+    word followed by its tags, separated by tabs.
+    """
+    lines = []
+    for word in tagger.tag_dict:
+        tags = tagger.candidates(word)
+        if tags is not None:
+            lines.append("\t".join([word] + list(tags)))
+    return lines
+
+def encode_strings(strings):
+    return "\n".join(strings).encode('utf-8')
 
-def store_model(model, filename):
-    model_struct = {'classifier':{'weights':model.classifier.weights, 'classes':model.classifier.classes},
-                   'tagger':{'weights':model.tagger.weights, 'tags':model.tagger.tags}}
+def decode_strings(data):
+    if len(data) == 0:
+        return []
+    return str(data, 'utf-8').split("\n")
+
+def little_endian(numbers):
+    if sys.byteorder != 'little':
+        numbers = array(numbers.typecode, numbers)
+        numbers.byteswap()
+    return numbers.tobytes()
+
+def encode_model(model, dtype='f32'):
+    """
+    Encodes a model in the binary format, with weights of type `dtype`
+    ('f32', 'f16' or 'i8'), and returns it as bytes.
+    """
+    if dtype not in DTYPES:
+        raise ValueError("unknown weight type {}".format(dtype))
+    classes, classifier_features, classifier_weights = table_arrays(model.classifier.weights)
+    tags, tagger_features, tagger_weights = table_arrays(model.tagger.weights)
+    words, counts = words_counts(model.tagger)
+    hashing = {prefix: {'buckets': table.feature_ids.buckets, 'signed': table.feature_ids.signed}
+               for prefix, table in [('classifier', model.classifier.weights), ('tagger', model.tagger.weights)]
+               if H.is_hashed(table)}
+    classifier_offsets, classifier_index = V.build(classifier_features or [])
+    tagger_offsets, tagger_index = V.build(tagger_features or [])
+    classifier_weights, classifier_scales = encode_weights(classifier_weights, len(classes), dtype)
+    tagger_weights, tagger_scales = encode_weights(tagger_weights, len(tags), dtype)
+
+    sections = [
+        ('classifier/features', encode_strings(classifier_features or [])),
+        ('classifier/weights', classifier_weights),
+        ('tagger/features', encode_strings(tagger_features or [])),
+        ('tagger/weights', tagger_weights),
+        ('tagger/words', encode_strings(words)),
+        ('tagger/counts', little_endian(counts)),
+        ('tagger/tagdict', encode_strings(tag_dict_lines(model.tagger))),
+        ('classifier/offsets', little_endian(classifier_offsets)),
+        ('classifier/index', little_endian(classifier_index)),
+        ('tagger/offsets', little_endian(tagger_offsets)),
+        ('tagger/index', little_endian(tagger_index)),
+    ]
+    if dtype == 'i8':
+        sections += [('classifier/scales', classifier_scales), ('tagger/scales', tagger_scales)]
+    for prefix in hashing:
+        sections = [(name, data) for name, data in sections
+                    if name not in (prefix + '/features', prefix + '/offsets', prefix + '/index')]
+
+    # The offsets of the sections depend on the size of the meta data, which
+    # in turn depends on the offsets, so the meta data is padded with spaces
+    # and grown until the offsets fit.
+    meta_size = 0
+    while True:
+        table = {}
+        offset = HEADER.size + meta_size
+        for name, data in sections:
+            table[name] = [offset, len(data)]
+            offset += len(data) + (-len(data) % 8)
+        meta = {'classes': classes, 'tags': tags, 'templates': templates(model), 'sections': table}
+        if dtype != 'f32':
+            meta['dtype'] = {'classifier': dtype, 'tagger': dtype}
+        if len(hashing) > 0:
+            meta['hashing'] = hashing
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        if len(meta_bytes) <= meta_size:
+            break
+        meta_size = len(meta_bytes) + 16
+        meta_size += -(HEADER.size + meta_size) % 8
+    meta_bytes += b' ' * (meta_size - len(meta_bytes))
+
+    body = bytearray(meta_bytes)
+    for name, data in sections:
+        body += data
+        body += bytes(-len(data) % 8)
+    checksum = zlib.crc32(body)
+
+    if len(hashing) > 0:
+        version = 4
+    elif any(t is not None for t in meta['templates'].values()):
+        version = 3
+    else:
+        version = 1 if dtype == 'f32' else 2
+    return HEADER.pack(MAGIC, version, checksum, meta_size) + bytes(body)
+
+def fingerprint(model):
+    """
+    Returns the checksum that the model would have in the binary format.
+    """
+    checksum = getattr(model, 'checksum', None)
+    if checksum is not None:
+        return checksum
+    return HEADER.unpack_from(encode_model(model))[2]
+
+def store_model(model, filename, dtype='f32'):
+    """
+    Stores a model (a `Parser` or a `FrozenParser`) in the binary format,
+    with weights of type `dtype` ('f32', 'f16' or 'i8').
+
+    The file is read back once after writing, and its checksum is compared
+    to that of the data that was written; an `IOError` is raised if they
+    differ.
+    """
+    data = encode_model(model, dtype)
+    with open(filename, 'wb') as file:
+        file.write(data)
+
+    with open(filename, 'rb') as file:
+        stored = file.read()
+    if zlib.crc32(stored[HEADER.size:]) != HEADER.unpack_from(data)[2]:
+        raise IOError("stored model differs from the written data in {}".format(filename))
+
+def is_binary_model(file_name):
+    with open(file_name, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+def read_model(file_name, frozen=False, verify=True, shared=False):
+    """
+    Reads a model from a file. If `frozen` is true, the model is returned
+    as a read-only `FrozenParser`.
+
+    Binary models are memory-mapped, and a frozen model reads its weights
+    directly from the mapped file. If `shared` is true, a frozen model also
+    looks up its features in the mapped file (with `vocab.MappedVocab`)
+    instead of in dicts, so that all of its weight tables are shared by the
+    processes that use it. If `verify` is true, the checksum of the file is
+    checked. Files in the JSON format are read with `import_json()`.
+    """
+    if not is_binary_model(file_name):
+        return import_json(file_name, frozen)
+
+    with open(file_name, 'rb') as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, checksum, meta_size = HEADER.unpack_from(data)
+    if version > VERSION:
+        raise ValueError("unsupported model version {} in {}".format(version, file_name))
+    if verify and zlib.crc32(memoryview(data)[HEADER.size:]) != checksum:
+        raise ValueError("checksum mismatch in {}".format(file_name))
+    meta = json.loads(bytes(data[HEADER.size:HEADER.size + meta_size]))
+
+    def section(name, typecode=None):
+        offset, size = meta['sections'][name]
+        view = memoryview(data)[offset:offset + size]
+        if typecode is None:
+            return decode_strings(view)
+        if sys.byteorder != 'little':
+            numbers = array(typecode, view)
+            numbers.byteswap()
+            return numbers
+        return view.cast(typecode)
+
+    def table(prefix, classes):
+        hashing = meta.get('hashing', {}).get(prefix)
+        if hashing is not None:
+            feature_ids = None
+        elif shared and prefix + '/index' in meta['sections']:
+            feature_ids = V.MappedVocab(section(prefix + '/features', 'B'), section(prefix + '/offsets', 'I'),
+                                        section(prefix + '/index', 'I'))
+        else:
+            features = section(prefix + '/features')
+            feature_ids = dict(zip(features, range(len(features))))
+        dtype = meta.get('dtype', {}).get(prefix, 'f32')
+        if dtype == 'f16':
+            offset, size = meta['sections'][prefix + '/weights']
+            weights = array('f', struct.unpack_from('<{}e'.format(size // 2), data, offset))
+        else:
+            weights = section(prefix + '/weights', DTYPES[dtype])
+        scales = section(prefix + '/scales', 'f') if dtype == 'i8' else None
+        if hashing is not None:
+            return H.FrozenHashedTable(classes, hashing['buckets'], hashing['signed'], weights, scales)
+        return W.FrozenTable(classes, feature_ids, weights, scales)
+
+    def trainable_table(table, classes):
+        if H.is_hashed(table):
+            return H.HashedTable.from_weights(classes, table.feature_ids.buckets, table.feature_ids.signed,
+                                              table_arrays(table)[2])
+        return W.WeightTable.from_dict(table.to_dict(), classes)
+
+    words = section('tagger/words')
+    counts = section('tagger/counts', 'I')
+    tag_dict = {}
+    if 'tagger/tagdict' in meta['sections']:
+        for line in section('tagger/tagdict'):
+            entry = line.split("\t")
+            tag_dict[entry[0]] = entry[1:]
+    parser_features, tagger_features = feature_sets(meta)
+    tagger = F.FrozenTagger(table('tagger', meta['tags']),
+                            (w for w, n in zip(words, counts) if n > T.FREQUENT), tag_dict, tagger_features)
+    model = F.FrozenParser(tagger, F.FrozenClassifier(table('classifier', meta['classes'])),
+                           file_name, checksum, shared, parser_features)
+    if frozen:
+        return model
+
+    trainable = P.Parser()
+    set_feature_sets(trainable, meta)
+    trainable.classifier.weights = trainable_table(model.classifier.weights, meta['classes'])
+    trainable.classifier.classes = trainable.classifier.weights.classes
+    trainable.tagger.weights = trainable_table(model.tagger.weights, meta['tags'])
+    trainable.tagger.tags = trainable.tagger.weights.classes
+    trainable.tagger.words_freq = dict(zip(words, counts))
+    trainable.tagger.tag_dict = {w: set(tags) for w, tags in tag_dict.items()}
+    return trainable
+
+def export_json(model, filename):
+    """
+    Stores a model in the JSON format.
+    """
+    words, counts = words_counts(model.tagger)
+    model_struct = {'classifier':{'weights':model.classifier.weights.to_dict(), 'classes':list(model.classifier.classes)},
+                   'tagger':{'weights':model.tagger.weights.to_dict(), 'tags':list(model.tagger.tags),
+                             'words_freq':dict(zip(words, counts.tolist())),
+                             'tag_dict':{w: sorted(tags) for w, tags in model.tagger.tag_dict.items()}},
+                   'templates':templates(model)}
     model_string = json.dumps(model_struct)
     file = open(filename, 'w')
     file.write(model_string)
     file.close()
 
-    new_model = read_model(filename)
-    if new_model.classifier.weights != model.classifier.weights:
-        print("Classifier weights differ!")
-        print(model.classifier.weights)
-        print(new_model.classifier.weights)
-    if new_model.classifier.classes != model.classifier.classes:
-        print("Classifier classes differ!")
-    if new_model.tagger.weights != model.tagger.weights:
-        print("Tagger weights differ!")
-    if new_model.tagger.tags != model.tagger.tags:
-        print("Tagger tags differ!")
-
-def read_model(file_name):
+def import_json(file_name, frozen=False):
+    """
+    Reads a model stored in the JSON format.
+    """
     file = open(file_name, 'r')
     model_string = file.read()
+    file.close()
     model_struct = json.loads(model_string)
     model = P.Parser()
-    model.classifier.weights = model_struct['classifier']['weights']
-    model.classifier.classes = model_struct['classifier']['classes']
-    model.tagger.weights = model_struct['tagger']['weights']
-    model.tagger.tags = model_struct['tagger']['tags']
+    set_feature_sets(model, model_struct)
+    model.classifier.weights = W.WeightTable.from_dict(model_struct['classifier']['weights'], model_struct['classifier']['classes'])
+    model.classifier.classes = model.classifier.weights.classes
+    model.tagger.weights = W.WeightTable.from_dict(model_struct['tagger']['weights'], model_struct['tagger']['tags'])
+    model.tagger.tags = model.tagger.weights.classes
+    model.tagger.words_freq = model_struct['tagger'].get('words_freq', {})
+    model.tagger.tag_dict = {w: set(tags) for w, tags in model_struct['tagger'].get('tag_dict', {}).items()}
 
+    if frozen:
+        return F.freeze(model)
     return model
@@ -0,0 +1,113 @@
+"""
+A cache of parse results for sentences that are parsed repeatedly.
+
+Headlines and news feeds repeat the same sentences over and over, so a
+parser can keep the tags and trees of the sentences it has parsed and
+return them again without tagging and parsing the sentence anew. Entries
+are keyed by the words of the sentence, the beam width and a fingerprint
+of the model, so that a cache is never used with a model that gives
+different results. The cache is bounded by its number of entries and,
+optionally, by the (approximate) number of bytes of its entries, and
+evicts the least recently used entries first.
+
+An optional SQLite database on disk backs the cache: results that are not
+in memory are looked up there, and new results are added to it, so that
+the cache survives restarts and can be shared by several processes. Keys
+and results are stored as JSON, so that reading a database that someone
+else can write runs no code of theirs.
+"""
+
+import json
+import sqlite3
+
+from . import lru as L
+
+def sizeof(key, value):
+    """
+    Returns the approximate number of bytes used by a cache entry.
+    """
+    fingerprint, beam_width, words = key
+    tags, tree = value
+    return 200 + sum(50 + len(w) for w in words) + 8 * (len(tags) + len(tree))
+
+class ParseCache():
+    """
+    A bounded LRU cache of (tags, tree) results, optionally backed by disk.
+    """
+
+    def __init__(self, max_entries=100000, max_bytes=None, path=None):
+        self.memory = L.LRUCache(max_entries, max_bytes, sizeof)
+        self.fingerprint = None
+        self.db = None
+        self.disk_hits = 0
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT)")
+            self.db.commit()
+
+    def __getstate__(self):
+        # A cache that is sent to a worker process starts out empty there.
+        return {'max_entries': self.memory.maxsize, 'max_bytes': self.memory.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state['max_entries'], state['max_bytes'])
+
+    def key(self, model, words, beam_width):
+        if self.fingerprint is None:
+            self.fingerprint = model.fingerprint()
+        return (self.fingerprint, beam_width, tuple(words))
+
+    def get(self, key):
+        """
+        Returns the cached (tags, tree) for a key, or None.
+        """
+        result = self.memory.get(key)
+        if result is None and self.db is not None:
+            row = self.db.execute("SELECT result FROM results WHERE key = ?", (self.disk_key(key),)).fetchone()
+            if row is not None:
+                tags, tree = json.loads(row[0])
+                result = (tuple(tags), tuple(tree))
+                self.memory.put(key, result)
+                self.disk_hits += 1
+        if result is None:
+            return None
+        tags, tree = result
+        return (list(tags), list(tree))
+
+    def put(self, key, tags, tree):
+        result = (tuple(tags), tuple(tree))
+        self.memory.put(key, result)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?)",
+                            (self.disk_key(key), json.dumps(result)))
+            self.db.commit()
+
+    def disk_key(self, key):
+        fingerprint, beam_width, words = key
+        return json.dumps([fingerprint, beam_width, words])
+
+    def invalidate(self):
+        """
+        Forgets the cached results in memory and the fingerprint of the
+        model, after the model has changed.
+        """
+        self.memory.clear()
+        self.fingerprint = None
+
+    def stats(self):
+        """
+        Returns the size, hits, misses and hit rate of the cache; hits
+        include results found on disk.
+        """
+        stats = self.memory.stats()
+        stats['disk_hits'] = self.disk_hits
+        stats['hits'] += self.disk_hits
+        stats['misses'] -= self.disk_hits
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups > 0 else 0.0
+        return stats
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
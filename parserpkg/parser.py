@@ -1,5 +1,12 @@
+import heapq
+import math
+
 from . import tagger as T
 from . import classifier as C
+from . import batch as B
+from . import state as St
+from . import instrument as I
+from . import features as FE
 
 class Parser():
     """
@@ -20,221 +27,167 @@ class Parser():
     tree, represented as a list of indices such that `tree[i]` gives the index
     of the head (parent node) of the word at position `i`, or 0 in case the
     corresponding word has not yet been assigned a head.
+
+    With `buckets`, the tagger and the classifier hash their features into
+    weight tables with that many rows (see the `hashing` module), optionally
+    with `signed` hashing.
     """
 
-    def __init__(self):
-        self.tagger = T.Tagger()
-        self.classifier = C.Classifier()
+    # An optional `ParseCache` of the results of `parse()`.
+    cache = None
+    # The compiled feature templates (see the `features` module), or None for
+    # parsers trained with the original, hand-written features.
+    feature_set = None
+
+    def __init__(self, templates=None, tagger_templates=None, buckets=None, signed=False):
+        self.feature_set = FE.ParserFeatures(templates)
+        self.tagger = T.Tagger(tagger_templates, buckets, signed)
+        self.classifier = C.Classifier(buckets, signed)
 
     def parse(self, words, beam_width):
         """
         Parses a sentence.
         """
-        predicted_tags = self.tagger.tag(words)
-
-        i = 0
-        stack = []
-        dependency_tree = [0] * len(words)
-        cfg = (i, stack, dependency_tree)
-
-        beam = []
-        beam_width = beam_width
-
-        valid_moves = self.valid_moves(cfg[0], cfg[1], cfg[2])
-
-        beam.append([cfg, 0, valid_moves])
-
-        yesmilord = True
-
-        beam_id = 0
-        while yesmilord:
-            temp_beam = []
-
-            beam_id += 1
+        if self.cache is not None:
+            key = self.cache.key(self, words, beam_width)
+            result = self.cache.get(key)
+            if result is not None:
+                return result
 
-            for laser_id, laser in enumerate(beam):
-                loc_cfg = laser[0]
-                loc_score = laser[1]
-                for loc_move in laser[2]:
-                    # Predict the move
-                    feature_vector = self.features(words, predicted_tags, loc_cfg[0], loc_cfg[1], loc_cfg[2])
-                    predicted_move, delta_score = self.classifier.predict(feature_vector, [loc_move])
-
-                    #tempScore = loc_score / (beam_id**2) + deltaScore
-                    temp_score = delta_score
-
-                    #print("MOVE, doing", loc_move, ", delta score: ", deltaScore, ", new score: ", tempScore)
-
-                    # Do the move and update our index, stack and dependency_tree
-                    move = self.move(loc_cfg[0], loc_cfg[1], loc_cfg[2], predicted_move)
-                    temp_cfg = (move[0], move[1], move[2])
-
-                    temp_moves = self.valid_moves(temp_cfg[0], temp_cfg[1], temp_cfg[2])
-
-                    temp_laser = [temp_cfg, temp_score, temp_moves]
-
-                    if len(temp_beam) < beam_width:
-                        temp_beam.append(temp_laser)
-                    else:
-                        min_index = 0
-                        min_score = temp_beam[0][1]
-
-                        for j in range(0, len(temp_beam)):
-                            if temp_beam[j][1] < min_score:
-                                min_index = j
-                                min_score = temp_beam[j][1]
-
-                        if temp_laser[1] > min_score:
-                            temp_beam[min_index] = temp_laser
-
-            beam = temp_beam
-            yesmilord = False
-            for laser in beam:
-                if len(laser[2]) > 0:
-                    yesmilord = True
+        predicted_tags = self.tagger.tag(words)
 
-        max_index = 0
-        max_score = beam[0][1]
-        for j in range(0, len(beam)):
-            if beam[j][1] > max_score:
-                max_index = j
-                max_score = beam[j][1]
+        if beam_width == 1:
+            predicted_tree = self.parse_greedy(words, predicted_tags)
+        else:
+            predicted_tree = self.parse_beam(words, predicted_tags, beam_width)
 
-        return (predicted_tags, beam[max_index][0][2])
+        if self.cache is not None:
+            self.cache.put(key, predicted_tags, predicted_tree)
+        return (predicted_tags, predicted_tree)
 
-    def valid_moves(self, i, stack, pred_tree):
+    def set_cache(self, cache):
         """
-        Returns the valid moves for the specified parser configuration.
+        Makes `parse()` look up and store its results in a `ParseCache`, or
+        stops caching if `cache` is None.
         """
-        valid_moves = []
+        self.cache = cache
 
-        # SHIFT = 0
-        if i < len(pred_tree):
-            valid_moves.append("SH")
-
-        # LEFT-ARC = 1
-        if len(stack) > 2:
-            valid_moves.append("LA")
-
-        # RIGHT-ARC = 2
-        if len(stack) > 1:
-            valid_moves.append("RA")
+    def fingerprint(self):
+        """
+        Returns a checksum of the weights and the tagger state of this model,
+        which changes whenever the results of `parse()` may change.
+        """
+        from . import model_storer as S
+        return S.fingerprint(self)
 
-        return valid_moves
+    def parse_greedy(self, words, tags):
+        """
+        Parses a tagged sentence by always taking the highest-scoring valid
+        move, in a single state that is updated in place.
 
-    def move(self, i, stack, pred_tree, move):
+        This gives the same tree as a beam search with a beam width of 1.
         """
-        Executes a single transition.
+        state = St.ParserState(len(words))
+        valid_moves = state.valid_moves()
+        while len(valid_moves) > 0:
+            feature_vector = self.features(words, tags, state.i, state.stack, state.tree)
+            scores = self.classifier.scores(feature_vector)
+            state.apply(max(valid_moves, key=lambda m: scores[m]))
+            valid_moves = state.valid_moves()
+        return state.tree
+
+    def parse_beam(self, words, tags, beam_width):
         """
+        Parses a tagged sentence with beam search.
+
+        The beam holds the `beam_width` states with the highest cumulative
+        scores. For every state in the beam, the features are extracted once
+        and all valid moves are scored in one pass; the successors of all
+        states are then ranked with a heap. As the classifier is trained on
+        individual moves, its activations are normalized over the valid moves
+        of each state (as log-probabilities of a softmax) before they are
+        added up along a path; raw activations are not comparable across
+        states, and summing them makes wide beams much less accurate. States
+        share their stacks and trees (see `BeamState`), so no tree is copied
+        until the end. The features only need the words at the top of the
+        stack, as deep as the feature templates look (two words for the
+        original features), so only those are taken from the shared stack,
+        and since they do not look at the partial tree, `None` is passed for
+        it.
+        """
+        n = len(words)
+        depth = self.feature_set.stack_depth if self.feature_set is not None else 2
+        beam = [St.BeamState()]
+        while True:
+            candidates = []
+            for state in beam:
+                valid_moves = state.valid_moves(n)
+                if len(valid_moves) == 0:
+                    candidates.append((state.score, state, None, 0.0))
+                    continue
+                feature_vector = self.features(words, tags, state.i, state.top(depth), None)
+                scores = self.classifier.scores(feature_vector)
+                top = max(scores[m] for m in valid_moves)
+                norm = top + math.log(sum(math.exp(scores[m] - top) for m in valid_moves))
+                for move in valid_moves:
+                    delta = scores[move] - norm
+                    candidates.append((state.score + delta, state, move, delta))
+            if all(c[2] is None for c in candidates):
+                break
+            best = heapq.nlargest(beam_width, candidates, key=lambda c: c[0])
+            beam = [state if move is None else state.apply(move, delta)
+                    for _, state, move, delta in best]
+        return max(beam, key=lambda state: state.score).tree(n)
+
+    def parse_many(self, sentences, beam_width=1, workers=None, chunk_size=64):
+        """
+        Parses a list of sentences in a pool of worker processes.
 
-        loc_stack = []
-        for j in range(0, len(stack)):
-            loc_stack.append(stack[j])
-        loc_tree = []
-        for j in range(0, len(pred_tree)):
-            loc_tree.append(pred_tree[j])
-
-        # LEFT-ARC = 1
-        if move == "LA":
-            top = loc_stack.pop()
-            second_top = loc_stack.pop()
-            loc_tree[second_top] = top
-            loc_stack.append(top)
-        # RIGHT-ARC = 2
-        elif move == "RA":
-            top = loc_stack.pop()
-            loc_tree[top] = loc_stack[-1]
-        # SHIFT = 0
-        else:
-            loc_stack.append(i)
-            i += 1
-
-        return (i, loc_stack, loc_tree)
+        Returns the (tags, tree) pairs in the order of the input. See the
+        `batch` module for how the work is distributed.
+        """
+        return B.parse_many(self, sentences, beam_width, workers, chunk_size)
 
-    def update(self, words, gold_tags, gold_tree):
+    def update(self, words, gold_tags, gold_tree, gold_moves=None):
         """
         Updates the move classifier with a single training example.
+
+        If the gold-standard moves of the sentence are given (as computed by
+        `corpus.oracle()`), they are used instead of asking the oracle for
+        every configuration.
         """
+        if self.cache is not None:
+            self.cache.invalidate()
         predicted_tags = self.tagger.update(words, gold_tags)
 
-        i = 0
-        stack = []
-        dependency_tree = [ 0 ] * len(words)
+        if gold_moves is not None:
+            state = St.ParserState(len(words))
+            for gold_move in gold_moves:
+                feature_vector = self.features(words, predicted_tags, state.i, state.stack, state.tree)
+                self.classifier.update(feature_vector, gold_move)
+                state.apply(gold_move)
+            return (predicted_tags, state.tree)
 
-        valid_moves = self.valid_moves(i, stack, dependency_tree)
+        state = St.ParserState(len(words), gold_tree)
 
-        while valid_moves != []:
+        while len(state.valid_moves()) > 0:
             # Predict the move
-            feature_vector = self.features(words, predicted_tags, i, stack, dependency_tree)
-            gold_move = self.gold_move(i, stack, dependency_tree, gold_tree)
+            feature_vector = self.features(words, predicted_tags, state.i, state.stack, state.tree)
+            gold_move = state.gold_move()
             self.classifier.update(feature_vector, gold_move)
 
             # Do the gold move and update index, stack and dependency_tree
-            move = self.move(i, stack, dependency_tree, gold_move)
-            i = move[0]
-            stack = move[1]
-            dependency_tree = move[2]
+            state.apply(gold_move)
 
-            # Get the valid moves for the next iteration
-            valid_moves = self.valid_moves(i, stack, dependency_tree)
-
-        return (predicted_tags, dependency_tree)
-
-    def gold_move(self, i, stack, pred_tree, gold_tree):
-        """
-        Returns the gold-standard move for the specified parser
-        configuration.
-
-        The gold-standard move is the first possible move from the following
-        list: LEFT-ARC, RIGHT-ARC, SHIFT. LEFT-ARC is possible if the topmost
-        word on the stack is the gold-standard head of the second-topmost word,
-        and all words that have the second-topmost word on the stack as their
-        gold-standard head have already been assigned their head in the
-        predicted tree. Symmetric conditions apply to RIGHT-ARC. SHIFT is
-        possible if at least one word in the input sentence still requires
-        processing.
-        """
-        valid_moves = self.valid_moves(i, stack, pred_tree)
-
-        if "LA" in valid_moves:
-            top_most_word = stack[len(stack) - 1]
-            second_top_most_word = stack[len(stack) - 2]
-            second_top_most_word_head = gold_tree[second_top_most_word]
-
-        if "RA" in valid_moves:
-            top_most_word = stack[len(stack) - 1]
-            top_most_word_head = gold_tree[top_most_word]
-            second_top_most_word = stack[len(stack) - 2]
-
-        # LEFT-ARC = 1
-        can_do_LA = False
-        if "LA" in valid_moves and second_top_most_word_head == top_most_word:
-            can_do_LA = True
-            for i in range(0, len(pred_tree)):
-                if gold_tree[i] == second_top_most_word and pred_tree[i] == 0:
-                    can_do_LA = False
-
-        if can_do_LA:
-            return "LA"
-
-        # RIGHT-ARC = 2
-        can_do_RA = False
-        if "RA" in valid_moves and top_most_word_head == second_top_most_word:
-            can_do_RA = True
-            for i in range(0, len(pred_tree)):
-                if gold_tree[i] == top_most_word and pred_tree[i] == 0:
-                    can_do_RA = False
-
-        if can_do_RA:
-            return "RA"
-
-        # SHIFT = 0
-        return "SH"
+        return (predicted_tags, state.tree)
 
     def features(self, words, tags, i, stack, parse):
         """
         Extracts features for the specified parser configuration.
         """
+        if self.feature_set is not None:
+            return self.feature_set.extract(words, tags, i, stack)
+
         def has_numbers(input_string):
             return any(char.isdigit() for char in input_string)
 
@@ -249,9 +202,32 @@ class Parser():
 
         return features
 
+    def instrument(self, stats=None):
+        """
+        Starts recording per-stage timings and counters for this parser, its
+        tagger and its classifier (see the `instrument` module), and returns
+        the `Stats` object they are recorded in.
+        """
+        self.uninstrument()
+        stats = stats if stats is not None else I.Stats()
+        I.instrument_parser(self, stats)
+        self.tagger.instrument(stats)
+        self.classifier.instrument(stats)
+        return stats
+
+    def uninstrument(self):
+        """
+        Stops recording timings and counters.
+        """
+        I.uninstrument(self)
+        self.tagger.uninstrument()
+        self.classifier.uninstrument()
+
     def finalize(self):
         """
         Averages the weight vectors.
         """
+        if self.cache is not None:
+            self.cache.invalidate()
         self.classifier.finalize()
         self.tagger.finalize()
@@ -0,0 +1,168 @@
+"""
+Streaming tagging and parsing of CoNLL-U files.
+
+Usage: python -m parserpkg.pipeline MODEL [INPUT] [OUTPUT] [options]
+
+Reads sentences in the CoNLL-U format (or, with --text, one sentence per
+line) from INPUT or stdin, tags and parses them with the model stored in
+MODEL, and writes them in the CoNLL-U format to OUTPUT or stdout, with the
+predicted UPOS and HEAD columns filled in. With --sentences or --shard, only
+a range of the sentences of INPUT is parsed, read directly from their byte
+offsets in the file (see `formattingpkg.index`), which lets a parse be
+resumed at a given sentence or a large file be split between jobs.
+
+Reading, parsing and writing run as three overlapped stages, connected by
+queues of a bounded number of batches, so that only a few batches of
+sentences are held in memory at any time, however large the input is. With
+more than one worker, the batches are parsed in a pool of processes, with a
+bounded number of batches in flight, and written in input order.
+"""
+
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from queue import Queue
+
+from formattingpkg import library as L
+from formattingpkg import index as IX
+from . import batch as B
+
+DONE = None
+
+def read_stage(source, text, batch_size, out_queue, errors):
+    try:
+        batch = []
+        for sentence in (L.text_sentences(source) if text else L.sentences(source)):
+            batch.append(sentence)
+            if len(batch) == batch_size:
+                out_queue.put(batch)
+                batch = []
+        if len(batch) > 0:
+            out_queue.put(batch)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        out_queue.put(DONE)
+
+def write_stage(target, in_queue, errors):
+    try:
+        while True:
+            item = in_queue.get()
+            if item is DONE:
+                break
+            batch, predictions = item
+            for (comments, rows), (tags, tree) in zip(batch, predictions):
+                L.write(target, comments, L.fill(rows, tags, tree))
+    except Exception as e:
+        errors.append(e)
+        # Keep draining the queue so that the parsing stage is not blocked.
+        while in_queue.get() is not DONE:
+            pass
+
+def run(model, source, target, text=False, beam_width=1, workers=1, batch_size=64, queue_size=8):
+    """
+    Tags and parses the sentences read from `source` and writes them to
+    `target`, as described in the module documentation.
+
+    At most `queue_size` batches of `batch_size` sentences wait between two
+    stages, and at most `2 * workers` batches are parsed at the same time.
+    Returns the number of sentences that were parsed.
+    """
+    read_queue = Queue(queue_size)
+    write_queue = Queue(queue_size)
+    errors = []
+    reader = threading.Thread(target=read_stage, args=(source, text, batch_size, read_queue, errors))
+    writer = threading.Thread(target=write_stage, args=(target, write_queue, errors))
+    reader.start()
+    writer.start()
+
+    finished = []
+
+    def batches():
+        while True:
+            batch = read_queue.get()
+            if batch is DONE:
+                finished.append(True)
+                return
+            yield batch, [L.words(rows) for comments, rows in batch]
+
+    n = 0
+    try:
+        if workers <= 1:
+            for batch, sentences in batches():
+                write_queue.put((batch, [model.parse(words, beam_width) for words in sentences]))
+                n += len(batch)
+        else:
+            with ProcessPoolExecutor(workers, initializer=B.init_worker, initargs=(model,)) as pool:
+                pending = deque()
+                for batch, sentences in batches():
+                    pending.append((batch, pool.submit(B.parse_chunk, sentences, beam_width)))
+                    if len(pending) >= 2 * workers:
+                        batch, job = pending.popleft()
+                        write_queue.put((batch, job.result()))
+                        n += len(batch)
+                while len(pending) > 0:
+                    batch, job = pending.popleft()
+                    write_queue.put((batch, job.result()))
+                    n += len(batch)
+    finally:
+        write_queue.put(DONE)
+        # Unblock the reader if parsing failed before the input was read.
+        if len(finished) == 0:
+            while read_queue.get() is not DONE:
+                pass
+        reader.join()
+        writer.join()
+    if len(errors) > 0:
+        raise errors[0]
+    return n
+
+def main(argv):
+    import argparse
+    from . import model_storer as S
+
+    ap = argparse.ArgumentParser(prog="python -m parserpkg.pipeline",
+                                 description="Tag and parse CoNLL-U (or plain text) as a stream.")
+    ap.add_argument("model", help="a model stored with model_storer.store_model")
+    ap.add_argument("input", nargs="?", help="input file (default: stdin)")
+    ap.add_argument("output", nargs="?", help="output file (default: stdout)")
+    ap.add_argument("--text", action="store_true", help="read one tokenized sentence per line")
+    ap.add_argument("--beam", type=int, default=1, help="beam width (default: 1)")
+    ap.add_argument("--workers", type=int, default=1, help="number of parsing processes (default: 1)")
+    ap.add_argument("--batch-size", type=int, default=64, help="sentences per batch (default: 64)")
+    ap.add_argument("--queue-size", type=int, default=8, help="batches buffered between stages (default: 8)")
+    ap.add_argument("--sentences", metavar="START:STOP",
+                    help="parse only these sentences of INPUT, read with its index (see formattingpkg.index)")
+    ap.add_argument("--shard", metavar="K/N",
+                    help="parse only the K-th of N parts of INPUT (counting from 0), read with its index")
+    args = ap.parse_args(argv)
+    if (args.sentences or args.shard) and (not args.input or args.text):
+        ap.error("--sentences and --shard need a CoNLL-U input file")
+
+    model = S.read_model(args.model, frozen=True)
+    if args.sentences or args.shard:
+        index = IX.load(args.input)
+        if args.shard:
+            k, n = map(int, args.shard.split("/"))
+            start, stop = index.shards(n)[k]
+        else:
+            start, stop = [int(x) if x else None for x in args.sentences.split(":")]
+        source = index.lines(start, stop)
+    else:
+        index = None
+        source = open(args.input, encoding='utf-8') if args.input else sys.stdin
+    target = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        n = run(model, source, target, args.text, args.beam, args.workers, args.batch_size, args.queue_size)
+    finally:
+        if index is not None:
+            index.close()
+        elif args.input:
+            source.close()
+        if args.output:
+            target.close()
+    print("Parsed {} sentences".format(n), file=sys.stderr)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
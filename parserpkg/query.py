@@ -0,0 +1,172 @@
+"""
+An indexed store of parsed sentences, and queries for patterns in them.
+
+A `TreeStore` holds (words, tags, tree) triples, as returned by
+`Parser.parse()`, with <ROOT> at position 0, and keeps inverted indexes
+from
+
+  - (head tag, dependent tag, direction) to the heads with such dependents,
+    and their dependents;
+  - tags and word forms to the positions of the words with them; and
+  - the roots of the trees (the words attached to <ROOT>).
+
+A `Pattern` describes a head word (by its tag, its form and whether it is a
+root), the dependents that it must have, and the dependents that should be
+collected, if there are any. For instance, a root VERB with NOUN dependents
+on both sides is
+
+    Pattern("VERB", root=True).having("NOUN", "left").having("NOUN", "right")
+
+`TreeStore.find()` answers a pattern by intersecting the postings of its
+constraints, without looking at the trees that cannot match.
+"""
+
+import os
+import pickle
+
+LEFT = "left"
+RIGHT = "right"
+
+class Pattern():
+    """
+    A head word with required and collected dependents.
+    """
+
+    def __init__(self, tag=None, word=None, root=False):
+        self.tag = tag
+        self.word = word
+        self.root = root
+        self.required = []
+        self.collected = []
+
+    def having(self, tag, direction=None):
+        """
+        Requires at least one dependent with `tag` on the given side ("left",
+        "right" or None for either), and collects them. Returns the pattern.
+        """
+        self.required.append((tag, direction))
+        return self.collect(tag, direction)
+
+    def collect(self, tag, direction=None):
+        """
+        Collects the dependents with `tag` on the given side, if there are
+        any. Returns the pattern.
+        """
+        if (tag, direction) not in self.collected:
+            self.collected.append((tag, direction))
+        return self
+
+class Match():
+    """
+    A match of a pattern: the sentence id, the position of the head and the
+    positions of the collected dependents, by (tag, direction).
+    """
+
+    def __init__(self, sentence, head, dependents):
+        self.sentence = sentence
+        self.head = head
+        self.dependents = dependents
+
+    def __repr__(self):
+        return "Match({!r}, {!r}, {!r})".format(self.sentence, self.head, self.dependents)
+
+class TreeStore():
+    """
+    Parsed sentences with inverted indexes on their arcs, tags and words.
+    """
+
+    def __init__(self):
+        self.sentences = []
+        self.arcs = {}
+        self.tags = {}
+        self.words = {}
+        self.roots = set()
+
+    def add(self, words, tags, tree):
+        """
+        Adds a parsed sentence and returns its id.
+        """
+        k = len(self.sentences)
+        self.sentences.append((list(words), list(tags), list(tree)))
+        for d in range(1, len(words)):
+            self.tags.setdefault(tags[d], set()).add((k, d))
+            self.words.setdefault(words[d], set()).add((k, d))
+            h = tree[d]
+            if h == 0:
+                self.roots.add((k, d))
+                continue
+            key = (tags[h], tags[d], LEFT if d < h else RIGHT)
+            self.arcs.setdefault(key, {}).setdefault((k, h), []).append(d)
+        return k
+
+    def add_many(self, parsed):
+        """
+        Adds (words, tags, tree) triples and returns the id of the first.
+        """
+        first = len(self.sentences)
+        for words, tags, tree in parsed:
+            self.add(words, tags, tree)
+        return first
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def __getitem__(self, k):
+        return self.sentences[k]
+
+    def postings(self, head_tag, tag, direction):
+        """
+        Returns the postings of the arcs from heads with `head_tag` (or any,
+        if None) to dependents with `tag` in `direction` (or either, if
+        None), as a list of dicts from (sentence, head) to dependents.
+        """
+        return [heads for (h, d, side), heads in self.arcs.items()
+                if (head_tag is None or h == head_tag) and d == tag and (direction is None or side == direction)]
+
+    def find(self, pattern):
+        """
+        Returns the matches of a pattern, ordered by sentence and head.
+        """
+        candidates = []
+        if pattern.tag is not None:
+            candidates.append(self.tags.get(pattern.tag, set()))
+        if pattern.word is not None:
+            candidates.append(self.words.get(pattern.word, set()))
+        if pattern.root:
+            candidates.append(self.roots)
+        for tag, direction in pattern.required:
+            heads = set()
+            for postings in self.postings(pattern.tag, tag, direction):
+                heads.update(postings)
+            candidates.append(heads)
+        if len(candidates) == 0:
+            heads = {(k, d) for k, (words, _, _) in enumerate(self.sentences) for d in range(1, len(words))}
+        else:
+            candidates.sort(key=len)
+            heads = set(candidates[0]).intersection(*candidates[1:])
+
+        collected = [(tag, direction, self.postings(pattern.tag, tag, direction))
+                     for tag, direction in pattern.collected]
+        matches = []
+        for head in sorted(heads):
+            dependents = {}
+            for tag, direction, postings in collected:
+                dependents[(tag, direction)] = sorted(d for p in postings for d in p.get(head, ()))
+            matches.append(Match(head[0], head[1], dependents))
+        return matches
+
+    def save(self, file_name):
+        """
+        Saves the store, writing a temporary file that is then renamed.
+        """
+        tmp = file_name + ".tmp"
+        with open(tmp, 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, file_name)
+
+def load(file_name):
+    """
+    Loads a store saved with `TreeStore.save()`.
+    """
+    with open(file_name, 'rb') as file:
+        return pickle.load(file)
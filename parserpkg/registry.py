@@ -0,0 +1,74 @@
+"""
+A registry of the models of several languages, shared by worker processes.
+
+A registry maps names (such as languages) to model files in the binary
+format, and loads every model the first time it is used, as a frozen
+parser whose weights and feature vocabularies stay in the memory-mapped
+file (see `model_storer.read_model()` with `shared=True`). The pages of a
+mapped file are shared by all the processes that map it, so the memory used
+for the models stays close to one copy of each model, however many workers
+there are:
+
+  - a registry that is pickled, as it is when it is sent to a spawned
+    worker process, only holds the file names, and the worker maps the
+    files itself, lazily; and
+  - a forked worker process inherits the mappings of the models that were
+    loaded before the fork, and reading them does not copy them, as no
+    Python objects are created for the weights or the features.
+"""
+
+from . import batch as B
+
+class Registry():
+    """
+    Lazily loaded, shared models, by name.
+    """
+
+    def __init__(self, paths=None):
+        self.paths = dict(paths or {})
+        self.models = {}
+
+    def __reduce__(self):
+        return (Registry, (self.paths,))
+
+    def register(self, name, path):
+        """
+        Adds the model stored in `path` under `name`, replacing the one
+        registered under that name, if any.
+        """
+        self.paths[name] = path
+        self.models.pop(name, None)
+
+    def names(self):
+        return list(self.paths)
+
+    def get(self, name):
+        """
+        Returns the model registered under `name`, loading it if necessary.
+        """
+        model = self.models.get(name)
+        if model is None:
+            from . import model_storer as S
+            model = S.read_model(self.paths[name], frozen=True, shared=True)
+            self.models[name] = model
+        return model
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def preload(self):
+        """
+        Loads all registered models, for instance before forking workers.
+        """
+        for name in self.paths:
+            self.get(name)
+
+    def parse(self, name, words, beam_width=1):
+        return self.get(name).parse(words, beam_width)
+
+    def parse_many(self, name, sentences, beam_width=1, workers=None, chunk_size=64):
+        """
+        Parses a list of sentences with the model registered under `name` in
+        a pool of worker processes (see `batch.parse_many()`).
+        """
+        return B.parse_many(self.get(name), sentences, beam_width, workers, chunk_size)
@@ -0,0 +1,335 @@
+"""
+A long-running parse service on a local socket.
+
+Usage: python -m parserpkg.server MODEL [options]
+
+Loads the model stored in MODEL once, and then tags and parses sentences
+sent to it over TCP (or a Unix socket, with --unix) until it is stopped.
+Every connection sends requests and receives responses in one of two ways:
+
+  - as lines of JSON, one request per line, answered in order with one line
+    of JSON each (a client may send many lines without waiting for their
+    responses, and they are batched together); or
+  - as HTTP/1.1 POST requests (to any path) with a JSON body, answered with
+    a JSON body, on a keep-alive connection.
+
+A request is an object {"words": [...]} with the tokens of one sentence
+(without <ROOT>), and optionally an "id", which is returned as is, and a
+"beam" width. The response holds the predicted "tags" and "tree" (with
+<ROOT> at index 0, as returned by `Parser.parse`) and the "timings" of the
+request in milliseconds: how long it waited for its batch ("queued_ms"),
+how long the batch took to parse ("parse_ms"), the total time in the server
+("total_ms"), and the number of sentences in the batch ("batch_size").
+
+Concurrent requests are coalesced into micro-batches: a batch is parsed as
+soon as it holds --max-batch sentences, or --max-wait-ms after its first
+sentence arrived, whichever comes first. With one worker, batches are
+parsed in a thread of the server process; with more, each of the worker
+processes keeps its own copy of the model, and up to one batch per worker
+is parsed at the same time. At most --max-pending requests wait for a
+batch; beyond that, the server stops reading from its connections until
+there is room again, so that clients are slowed down instead of the server
+running out of memory. A JSON line or HTTP body may be at most
+--max-request bytes long; longer JSON lines are answered with an error,
+and longer HTTP bodies with "413 Payload Too Large".
+"""
+
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from . import batch as B
+
+class Request():
+    """
+    A sentence waiting to be parsed, with the future of its result.
+    """
+
+    def __init__(self, words, beam_width, future):
+        self.words = ["<ROOT>"] + list(words)
+        self.beam_width = beam_width
+        self.future = future
+        self.arrived = time.perf_counter()
+
+class Server():
+    """
+    Parses the sentences of concurrent requests in micro-batches, with a
+    model that is loaded once.
+    """
+
+    def __init__(self, model, beam_width=1, workers=1, max_batch=32, max_wait=0.005, max_pending=1024,
+                 max_request=1 << 20):
+        self.model = model
+        self.beam_width = beam_width
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = None
+        self.max_pending = max_pending
+        self.max_request = max_request
+        self.executor = None
+
+    async def parse(self, words, beam_width=None):
+        """
+        Parses one sentence, and returns its tags, its tree and its timings.
+        """
+        request = Request(words, beam_width or self.beam_width, asyncio.get_running_loop().create_future())
+        # Waits while the queue is full; this is what slows down clients.
+        await self.queue.put(request)
+        return await request.future
+
+    async def batches(self):
+        """
+        Collects the waiting requests into batches and parses them, with at
+        most one batch per worker at a time.
+        """
+        slots = asyncio.Semaphore(self.workers)
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await slots.acquire()
+            task = loop.create_task(self.run_batch(batch))
+            task.add_done_callback(lambda _: slots.release())
+
+    async def run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        by_beam = {}
+        for request in batch:
+            by_beam.setdefault(request.beam_width, []).append(request)
+        for beam_width, requests in by_beam.items():
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, B.parse_each,
+                                                      [r.words for r in requests], beam_width)
+            except Exception as e:
+                for request in requests:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            end = time.perf_counter()
+            for request, (result, error) in zip(requests, results):
+                if request.future.done():
+                    continue
+                if error is not None:
+                    request.future.set_exception(ValueError(error))
+                    continue
+                tags, tree = result
+                request.future.set_result({
+                    'tags': tags, 'tree': tree,
+                    'timings': {'queued_ms': (start - request.arrived) * 1000,
+                                'parse_ms': (end - start) * 1000,
+                                'total_ms': (end - request.arrived) * 1000,
+                                'batch_size': len(requests)}})
+
+    async def respond(self, line):
+        """
+        Returns the response to one JSON request.
+        """
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict) or not isinstance(request.get('words'), list):
+                raise ValueError("a request must be an object with a list of \"words\"")
+            if not all(isinstance(w, str) and len(w) > 0 for w in request['words']):
+                raise ValueError("every word must be a non-empty string")
+            beam = request.get('beam')
+            if beam is not None and (not isinstance(beam, int) or isinstance(beam, bool) or beam < 1):
+                raise ValueError("the beam width must be a positive integer")
+            response = await self.parse(request['words'], beam)
+        except Exception as e:
+            response = {'error': str(e)}
+        if isinstance(request, dict) and 'id' in request:
+            response['id'] = request['id']
+        return response
+
+    async def handle(self, reader, writer):
+        """
+        Serves one connection. JSON lines are read without waiting for the
+        responses to the previous ones, so that the requests of one client
+        are batched together, and the responses are written in order by
+        `send()`. At most `max_pending` requests of a connection are
+        answered at a time.
+        """
+        loop = asyncio.get_running_loop()
+        replies = asyncio.Queue(self.max_pending)
+        sender = loop.create_task(self.send(replies, writer))
+        try:
+            while True:
+                line = await self.read_line(reader)
+                if line is None:
+                    reply = loop.create_future()
+                    reply.set_result({'error': "a request must be at most {} bytes".format(self.max_request)})
+                    await replies.put(reply)
+                    continue
+                if len(line) == 0:
+                    break
+                if line.startswith(b"POST ") or line.startswith(b"GET "):
+                    # The JSON lines before an HTTP request are answered
+                    # first.
+                    await replies.join()
+                    if not await self.handle_http(line, reader, writer):
+                        break
+                    continue
+                if len(line.strip()) == 0:
+                    continue
+                await replies.put(loop.create_task(self.respond(line)))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            await replies.put(None)
+            await sender
+            writer.close()
+
+    async def read_line(self, reader):
+        """
+        Reads a line, or returns None if it is longer than `max_request`
+        bytes, in which case the line is skipped.
+        """
+        try:
+            return await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+        while True:
+            await reader.readexactly(consumed)
+            try:
+                await reader.readuntil(b"\n")
+                return None
+            except asyncio.IncompleteReadError:
+                return None
+            except asyncio.LimitOverrunError as e:
+                consumed = e.consumed
+
+    async def send(self, replies, writer):
+        """
+        Writes the responses of the tasks in `replies`, in order, until it
+        gets None.
+        """
+        connected = True
+        while True:
+            task = await replies.get()
+            try:
+                if task is None:
+                    return
+                response = await task
+                if connected:
+                    writer.write(json.dumps(response).encode('utf-8') + b"\n")
+                    await writer.drain()
+            except ConnectionError:
+                # The remaining requests are still answered, but not written.
+                connected = False
+            finally:
+                replies.task_done()
+
+    async def handle_http(self, request_line, reader, writer):
+        """
+        Answers one HTTP request, and returns whether the connection is kept
+        open.
+        """
+        headers = {}
+        while True:
+            line = await self.read_line(reader)
+            if line is None:
+                headers = None
+                break
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+        # Without a valid length, the end of the request is unknown, and the
+        # connection is closed after the response.
+        keep_alive = headers is not None and headers.get('connection', '').lower() != 'close'
+        length = headers.get('content-length', '0') if headers is not None else None
+        if headers is None:
+            status, response = "400 Bad Request", {'error': "a header line is too long"}
+        elif request_line.startswith(b"GET "):
+            status, response = "405 Method Not Allowed", {'error': "use POST with a JSON body"}
+        elif not length.isdigit():
+            status, response = "400 Bad Request", {'error': "invalid Content-Length"}
+            keep_alive = False
+        elif int(length) > self.max_request:
+            status, response = "413 Payload Too Large", {
+                'error': "a request must be at most {} bytes".format(self.max_request)}
+            keep_alive = False
+        else:
+            body = await reader.readexactly(int(length))
+            response = await self.respond(body)
+            status = "400 Bad Request" if 'error' in response else "200 OK"
+        body = json.dumps(response).encode('utf-8')
+        writer.write("HTTP/1.1 {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n"
+                     .format(status, len(body), "keep-alive" if keep_alive else "close").encode('latin-1') + body)
+        await writer.drain()
+        return keep_alive
+
+    async def serve(self, host="127.0.0.1", port=8765, unix=None, ready=None):
+        """
+        Serves requests until the task is cancelled. If given, `ready` is
+        called with the listening server once it accepts connections.
+        """
+        self.queue = asyncio.Queue(self.max_pending)
+        if self.workers <= 1:
+            B.init_worker(self.model)
+            self.executor = ThreadPoolExecutor(1)
+        else:
+            self.executor = ProcessPoolExecutor(self.workers, initializer=B.init_worker, initargs=(self.model,))
+        batcher = asyncio.get_running_loop().create_task(self.batches())
+        try:
+            if unix is not None:
+                server = await asyncio.start_unix_server(self.handle, unix, limit=self.max_request)
+            else:
+                server = await asyncio.start_server(self.handle, host, port, limit=self.max_request)
+            async with server:
+                if ready is not None:
+                    ready(server)
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if self.workers <= 1:
+                B.init_worker(None)
+
+def main(argv):
+    import argparse
+    from . import model_storer as S
+
+    ap = argparse.ArgumentParser(prog="python -m parserpkg.server",
+                                 description="Serve tagging and parsing on a local socket.")
+    ap.add_argument("model", help="a model stored with model_storer.store_model")
+    ap.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    ap.add_argument("--port", type=int, default=8765, help="TCP port (default: 8765)")
+    ap.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    ap.add_argument("--beam", type=int, default=1, help="default beam width (default: 1)")
+    ap.add_argument("--workers", type=int, default=1, help="number of parsing processes (default: 1)")
+    ap.add_argument("--max-batch", type=int, default=32, help="sentences per batch (default: 32)")
+    ap.add_argument("--max-wait-ms", type=float, default=5.0,
+                    help="longest wait for a batch to fill up (default: 5)")
+    ap.add_argument("--max-pending", type=int, default=1024,
+                    help="requests waiting for a batch before clients are slowed down (default: 1024)")
+    ap.add_argument("--max-request", type=int, default=1 << 20,
+                    help="longest JSON line or HTTP body in bytes (default: 1048576)")
+    args = ap.parse_args(argv)
+
+    model = S.read_model(args.model, frozen=True)
+    server = Server(model, args.beam, args.workers, args.max_batch, args.max_wait_ms / 1000, args.max_pending,
+                    args.max_request)
+    where = args.unix if args.unix else "{}:{}".format(args.host, args.port)
+    ready = lambda _: print("Serving {} on {}".format(args.model, where), file=sys.stderr)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix, ready))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,194 @@
+class ParserState():
+    """
+    A configuration of the arc-standard parser that is updated in place.
+
+    The state consists of the index `i` of the first word in the buffer, the
+    `stack` of word indices and the partial dependency `tree`, as described
+    in `Parser`. Moves are applied in place in constant time, and every move
+    is recorded so that it can be undone again with `undo()`.
+
+    If the state is created with a gold-standard tree, it also counts, for
+    every word, how many of its gold-standard dependents have not yet been
+    assigned a head. This is what the static oracle needs to know to decide
+    whether a LEFT-ARC or RIGHT-ARC is possible, and keeping the counts up
+    to date makes `gold_move()` take constant time.
+    """
+
+    def __init__(self, n, gold_tree=None):
+        self.i = 0
+        self.stack = []
+        self.tree = [0] * n
+        self.history = []
+        self.gold_tree = gold_tree
+        self.pending = None
+        if gold_tree is not None:
+            self.pending = [0] * n
+            for d in range(1, n):
+                self.pending[gold_tree[d]] += 1
+
+    def valid_moves(self):
+        """
+        Returns the valid moves for this state.
+        """
+        valid_moves = []
+
+        # SHIFT = 0
+        if self.i < len(self.tree):
+            valid_moves.append("SH")
+
+        # LEFT-ARC = 1
+        if len(self.stack) > 2:
+            valid_moves.append("LA")
+
+        # RIGHT-ARC = 2
+        if len(self.stack) > 1:
+            valid_moves.append("RA")
+
+        return valid_moves
+
+    def attach(self, dependent, head):
+        self.tree[dependent] = head
+        if self.pending is not None:
+            self.pending[self.gold_tree[dependent]] -= 1
+
+    def detach(self, dependent):
+        self.tree[dependent] = 0
+        if self.pending is not None:
+            self.pending[self.gold_tree[dependent]] += 1
+
+    def apply(self, move):
+        """
+        Executes a single transition.
+        """
+        stack = self.stack
+        # LEFT-ARC = 1
+        if move == "LA":
+            second_top = stack.pop(-2)
+            self.attach(second_top, stack[-1])
+            self.history.append((move, second_top))
+        # RIGHT-ARC = 2
+        elif move == "RA":
+            top = stack.pop()
+            self.attach(top, stack[-1])
+            self.history.append((move, top))
+        # SHIFT = 0
+        else:
+            stack.append(self.i)
+            self.i += 1
+            self.history.append((move, None))
+
+    def undo(self):
+        """
+        Undoes the last transition.
+        """
+        move, word = self.history.pop()
+        if move == "LA":
+            self.detach(word)
+            self.stack.insert(len(self.stack) - 1, word)
+        elif move == "RA":
+            self.detach(word)
+            self.stack.append(word)
+        else:
+            self.stack.pop()
+            self.i -= 1
+
+    def gold_move(self):
+        """
+        Returns the gold-standard move for this state.
+
+        The gold-standard move is the first possible move from the following
+        list: LEFT-ARC, RIGHT-ARC, SHIFT. LEFT-ARC is possible if the topmost
+        word on the stack is the gold-standard head of the second-topmost word,
+        and all words that have the second-topmost word on the stack as their
+        gold-standard head have already been assigned their head in the
+        predicted tree. Symmetric conditions apply to RIGHT-ARC. SHIFT is
+        possible if at least one word in the input sentence still requires
+        processing.
+        """
+        stack = self.stack
+        gold_tree = self.gold_tree
+
+        # LEFT-ARC = 1
+        if len(stack) > 2 and gold_tree[stack[-2]] == stack[-1] and self.pending[stack[-2]] == 0:
+            return "LA"
+
+        # RIGHT-ARC = 2
+        if len(stack) > 1 and gold_tree[stack[-1]] == stack[-2] and self.pending[stack[-1]] == 0:
+            return "RA"
+
+        # SHIFT = 0
+        return "SH"
+
+class BeamState():
+    """
+    An immutable configuration of the arc-standard parser for beam search.
+
+    Applying a move returns a new state that shares everything but a
+    constant amount of data with the old one: the stack is a linked list of
+    (top, rest) pairs, and the arcs built so far are a linked list of
+    (dependent, head, previous arcs) triples, so that the states in a beam
+    never copy the stack or the tree. The `score` of a state is the sum of
+    the scores of the moves that led to it.
+    """
+
+    __slots__ = ('i', 'stack', 'depth', 'arcs', 'score')
+
+    def __init__(self, i=0, stack=None, depth=0, arcs=None, score=0.0):
+        self.i = i
+        self.stack = stack
+        self.depth = depth
+        self.arcs = arcs
+        self.score = score
+
+    def valid_moves(self, n):
+        """
+        Returns the valid moves for this state, in a sentence of `n` words.
+        """
+        valid_moves = []
+        if self.i < n:
+            valid_moves.append("SH")
+        if self.depth > 2:
+            valid_moves.append("LA")
+        if self.depth > 1:
+            valid_moves.append("RA")
+        return valid_moves
+
+    def top(self, k=2):
+        """
+        Returns the (at most) `k` topmost words on the stack, topmost last,
+        as a list that can be used in place of the stack for features.
+        """
+        words = []
+        stack = self.stack
+        while stack is not None and len(words) < k:
+            words.append(stack[0])
+            stack = stack[1]
+        words.reverse()
+        return words
+
+    def apply(self, move, delta):
+        """
+        Returns the state after a transition with score `delta`.
+        """
+        score = self.score + delta
+        # LEFT-ARC = 1
+        if move == "LA":
+            top, (second_top, rest) = self.stack
+            return BeamState(self.i, (top, rest), self.depth - 1, (second_top, top, self.arcs), score)
+        # RIGHT-ARC = 2
+        if move == "RA":
+            top, rest = self.stack
+            return BeamState(self.i, rest, self.depth - 1, (top, rest[0], self.arcs), score)
+        # SHIFT = 0
+        return BeamState(self.i + 1, (self.i, self.stack), self.depth + 1, self.arcs, score)
+
+    def tree(self, n):
+        """
+        Returns the dependency tree built by this state.
+        """
+        tree = [0] * n
+        arcs = self.arcs
+        while arcs is not None:
+            dependent, head, arcs = arcs
+            tree[dependent] = head
+        return tree
@@ -1,3 +1,13 @@
+from . import instrument as I
+from . import batch as B
+from . import lru as L
+from . import features as FE
+from . import hashing as H
+
+FREQUENT = 70         # Words seen more often than this count as frequent
+CACHE_SIZE = 10000    # Number of words whose static feature scores are cached
+TAGDICT_FREQ = 20     # Words seen at least this often are only given tags they were seen with
+
 class Tagger():
     """
     A part-of-speech tagger based on a multi-class perceptron classifier.
@@ -5,72 +15,131 @@ class Tagger():
     This tagger implements a simple, left-to-right tagging algorithm where the
     prediction of the tag for the next word in the sentence can be based on the
     surrounding words and the previously predicted tags. The exact features
-    that this prediction is based on can be controlled with the `features()`
-    method, which should return a feature vector that can be used as an input
-    to the multi-class perceptron.
+    that this prediction is based on are given by feature templates (see the
+    `features` module). Taggers that were trained before templates existed
+    have no `feature_set` and use the original, hand-written features.
+    With `buckets`, the features are hashed into a table of that many rows
+    (see the `hashing` module).
     """
 
-    def __init__(self):
-        self.tags = []
-        self.weights = {}
-        self.acc = {}
+    feature_set = None
+    # Whether `update()` counts the words in `words_freq`. Training turns
+    # this off after the first pass over the data, so that the counts do
+    # not grow with the number of epochs.
+    count_words = True
+
+    def __init__(self, templates=None, buckets=None, signed=False):
+        self.feature_set = FE.TaggerFeatures(templates)
+        self.weights = H.table(buckets, signed)
+        self.tags = self.weights.classes
         self.count = 1
         self.words_freq = {}
+        self.tag_dict = {}
+        self.use_tag_dict = True
+        self.set_cache(CACHE_SIZE)
+
+    def is_frequent(self, word):
+        """
+        Tells whether a word occurred more than `FREQUENT` times in the
+        training data.
+        """
+        return self.words_freq.get(word, 0) > FREQUENT
 
-    def predict(self, x):
-        scores = {}
+    def candidates(self, word):
+        """
+        Returns the tags that a word was seen with in the training data, if
+        it was seen at least `TAGDICT_FREQ` times, or None otherwise.
+        """
+        tags = self.tag_dict.get(word)
+        if tags is not None and self.words_freq.get(word, 0) >= TAGDICT_FREQ:
+            return sorted(tags)
+        return None
 
-        for c in self.weights.keys():
-            for f in x:
-                scores[c] = scores.setdefault(c, 0.0) + self.weights[c].setdefault(f, 0.0)
+    def predict(self, x, candidates=None):
+        scores = self.weights.scores(self.weights.lookup(x))
 
-        return max(scores, key = lambda c: ( scores[c], c ))
+        return self.weights.best(scores, candidates)[0]
+
+    def predict_cached(self, words, i, pred_tags, candidates=None):
+        """
+        Predicts the tag of the word at position `i`, taking the scores of
+        the static features of the word from the cache.
+
+        The cache maps a word to the sum of the weight rows of its static
+        features, so only the context features are looked up per token.
+        """
+        word = words[i]
+        partial = self.cache.get(word)
+        if partial is None:
+            partial = self.weights.scores(self.weights.lookup(self.static_features(word)))
+            self.cache.put(word, partial)
+        ids = self.weights.lookup(self.context_features(words, i, pred_tags))
+        return self.weights.best(self.weights.scores(ids, partial), candidates)[0]
+
+    def set_cache(self, size):
+        """
+        Sets the number of words whose static feature scores are cached
+        during tagging, or disables the cache if `size` is 0.
+        """
+        self.cache = L.LRUCache(size) if size > 0 else None
 
     def tag(self, words):
         """
         Tags a sentence with part-of-speech tags.
+
+        Frequent words are only given one of the tags that they were seen
+        with in the training data (see `candidates()`); a word that was only
+        seen with one tag gets that tag without being scored.
         """
         tagged_sentence = []
         previous_tags = []
 
         for i in range(0, len(words)):
-            fv = self.features(words, i, previous_tags)
-
-            pc = self.predict(fv)
+            candidates = self.candidates(words[i]) if self.use_tag_dict else None
+            if candidates is not None and len(candidates) == 1:
+                pc = candidates[0]
+            elif self.cache is None:
+                pc = self.predict(self.features(words, i, previous_tags), candidates)
+            else:
+                pc = self.predict_cached(words, i, previous_tags, candidates)
 
             previous_tags.append(pc)
             tagged_sentence.append(pc)
 
         return tagged_sentence
 
+    def tag_many(self, sentences, workers=None, chunk_size=64):
+        """
+        Tags a list of sentences in a pool of worker processes.
+        """
+        return B.tag_many(self, sentences, workers, chunk_size)
+
     def update(self, words, gold_tags):
         """
         Updates the tagger with a single training example.
         """
         predicted_tags = []
+        if self.cache is not None:
+            self.cache.clear()
 
         i = 0
         for word in words:
-            self.words_freq[word] = self.words_freq.setdefault(word, 0) + 1
+            if self.count_words:
+                self.words_freq[word] = self.words_freq.setdefault(word, 0) + 1
             fv = self.features(words, i, gold_tags)
             y = gold_tags[i]
+            self.tag_dict.setdefault(word, set()).add(y)
 
-            if y not in self.tags:
-                self.tags.append(y)
-                self.weights[y] = {}
-                self.acc[y] = {}
+            if y not in self.weights.class_ids:
+                self.weights.add_class(y)
 
             i += 1
 
             p = self.predict(fv)
             predicted_tags.append(p)
             if p != y:
-                for f in fv:
-                    self.weights[p][f] = self.weights[p].setdefault(f, 0.0) - 1
-                    self.acc[p][f] = self.acc[p].setdefault(f, 0.0) - self.count
-
-                    self.weights[y][f] = self.weights[y].setdefault(f, 0.0) + 1
-                    self.acc[y][f] = self.acc[y].setdefault(f, 0.0) + self.count
+                ids = [self.weights.intern(f) for f in fv]
+                self.weights.update(ids, y, p, self.count)
         self.count += 1
 
         return predicted_tags
@@ -79,17 +148,53 @@ class Tagger():
         """
         Extracts features for the specified tagger configuration.
         """
+        return self.static_features(words[i]) + self.context_features(words, i, pred_tags)
+
+    def static_features(self, word):
+        """
+        Extracts the features that only depend on the word itself, and not
+        on its position or context, so that they can be cached per word.
+        """
+        if self.feature_set is not None:
+            return self.feature_set.static(word, self.is_frequent)
+
         def has_numbers(input_string):
             return any(char.isdigit() for char in input_string)
 
         const = "SMOTHING?"
+        w1 = word
+        f = "FREQUENT" if self.is_frequent(word) else "NOT FREQUENT"
+        long_word = "LONGER WORD" if len(word)> 3 else "SHORT WORD"
+        ends_with_y = "ENDS WITH Y" if word[-1] == 'y' else "DOES NOT END WITH Y"
+        one_letter_word = "ONE LETTER" if len(word) == 1 else "NOT ONE LETTER"
+        contains_digits = "HAS DIGITS" if has_numbers(word) else "NO DIGITS"
+
+        P = word[:1]
+        PP = word[:2]
+        PPP = word[:3]
+        S = word[-1:]
+        SS = word[-2:]
+        SSS = word[-3:]
+
+        result = [P+":"+str(0), PP+":"+str(1), PPP+":"+str(2), S, SS, SSS, one_letter_word+w1,
+        long_word, str(5)+":"+w1, ends_with_y+w1, const,
+        w1, w1, w1, w1, contains_digits+w1, f]
+
+        return result
+
+    def context_features(self, words, i, pred_tags):
+        """
+        Extracts the features that depend on the position of the word, the
+        surrounding words and the previously predicted tags.
+        """
+        if self.feature_set is not None:
+            return self.feature_set.context(words, i, pred_tags, self.is_frequent)
+
         t0 = pred_tags[i-1] if i > 0 else "BOS_TAG"
         t1 = pred_tags[i-2] if i > 1 else "BOS_TAG"
-        t2 = pred_tags[i-3] if i > 2 else "BOS_TAG"
         w0 = words[i-1] if i > 0 else "BOS"
         w1 = words[i]
         w2 = words[i+1] if i < len(words)-1 else "EOS"
-        w3 = words[i+2] if i < len(words)-2 else "EOS"
         if i > 0:
             if words[i][0].isupper():
                 starts_with_cap = "STARTS WITH CAP"
@@ -97,30 +202,33 @@ class Tagger():
                 starts_with_cap = "NO CAP"
         else:
             starts_with_cap = "BOS"
-        f = "FREQUENT" if self.words_freq.setdefault(words[i], 0) > 70 else "NOT FREQUENT"
-        all_in_caps = words[i][0].isupper() if i > 0 else "BOS"
-        long_word = "LONGER WORD" if len(words[i])> 3 else "SHORT WORD"
-        ends_with_y = "ENDS WITH Y" if words[i][-1] == 'y' else "DOES NOT END WITH Y"
-        one_letter_word = "ONE LETTER" if len(words[i]) == 1 else "NOT ONE LETTER"
-        contains_digits = "HAS DIGITS" if has_numbers(words[i]) else "NO DIGITS"
-
-        P = words[i][:1]
-        PP = words[i][:2]
-        PPP = words[i][:3]
-        S = words[i][-1:]
-        SS = words[i][-2:]
-        SSS = words[i][-3:]
-
-        result = [P+":"+str(0), PP+":"+str(1), PPP+":"+str(2), S, SS, SSS, one_letter_word+w1, 
-        long_word, str(5)+":"+w1, ends_with_y+w1, starts_with_cap, all_in_caps, t0+w1, t1+w1+":"+str(3), const,
-        w1, w1, w1, w1, t0+w0, t0+w1, t0+w2, w1+w2, w0+w1, contains_digits+w1, w2+":"+str(4), w0+w2, f]
+        all_in_caps = "CAPS:" + str(words[i][0].isupper()) if i > 0 else "BOS"
+
+        result = [starts_with_cap, all_in_caps, t0+w1, t1+w1+":"+str(3),
+        t0+w0, t0+w1, t0+w2, w1+w2, w0+w1, w2+":"+str(4), w0+w2]
 
         return result
 
+    def instrument(self, stats=None):
+        """
+        Starts recording timings and counters for this tagger, and returns
+        the `Stats` object they are recorded in.
+        """
+        self.uninstrument()
+        stats = stats if stats is not None else I.Stats()
+        I.instrument_tagger(self, stats)
+        return stats
+
+    def uninstrument(self):
+        """
+        Stops recording timings and counters.
+        """
+        I.uninstrument(self)
+
     def finalize(self):
         """
         Averages the weight vectors.
         """
-        for c in self.acc.keys():
-            for f in self.acc[c]:
-                self.weights[c][f] = self.weights[c].setdefault(f, 0.0) - self.acc[c].setdefault(f, 0.0) / self.count
+        self.weights.finalize(self.count)
+        if self.cache is not None:
+            self.cache.clear()
@@ -0,0 +1,169 @@
+"""
+Parallel training with iterative parameter mixing.
+
+The training corpus is split into one shard per worker process. In every
+epoch, each worker starts from the current mixed model, trains averaged
+perceptrons on its shard for one pass, and returns its averaged weights;
+the new mixed model is the average of the shard models, weighted by the
+number of sentences in each shard. With a single worker and a single epoch,
+this is the same as one serial pass over the corpus. Words are only counted
+in the first epoch, so that the word frequencies of the tagger (and with
+them, its frequent words and its tag dictionary) do not depend on the
+number of epochs.
+
+The result is an ordinary `Parser` whose accumulated updates are all zero,
+so that it can be finalized and stored as usual.
+
+Training can save checkpoints (see the `checkpoint` module) and resume from
+them. With a single worker, checkpoints are saved every few sentences, and
+the checkpoint saved at the end of the last epoch holds the complete state
+before averaging. With several workers, checkpoints are saved between
+epochs. A checkpoint records the number of training sentences and a digest
+of them, and is only resumed on the same sentences, or, to continue
+training on new data, on the same sentences followed by new ones. Such a
+continuation is only possible with a single worker and a single epoch,
+where it gives the same result as one pass over all the data; with more
+epochs, the earlier epochs would not have seen the new data.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from . import parser as P
+from . import checkpoint as K
+
+def shards(sentences, n):
+    """
+    Splits a list of training sentences into `n` shards of about the same
+    size, dealing them out round-robin.
+    """
+    return [sentences[k::n] for k in range(n)]
+
+def digest(sentences):
+    """
+    Returns a digest of the words, tags and trees of a list of training
+    sentences.
+    """
+    h = hashlib.sha1()
+    for sentence in sentences:
+        h.update(repr(tuple(sentence[:3])).encode('utf-8'))
+    return h.hexdigest()
+
+def train_epoch(model, sentences, start=0, progress=None):
+    """
+    Trains a parser on a list of (words, tags, tree) triples (or of
+    (words, tags, tree, moves) tuples, as read from a `corpus.Corpus`) for
+    one pass, starting at sentence `start`, and returns it, with averaged
+    weights.
+    If given, `progress(model, k)` is called after each of the first `k`
+    sentences has been trained on.
+    """
+    for k in range(start, len(sentences)):
+        model.update(*sentences[k])
+        if progress is not None:
+            progress(model, k + 1)
+    model.finalize()
+    return model
+
+def train_shard(model, sentences, start=0, progress=None):
+    """
+    Trains a copy of the mixed model on a shard in a worker process, and
+    returns the averaged model and the word counts of the shard.
+    """
+    words_freq = dict(model.tagger.words_freq)
+    train_epoch(model, sentences, start, progress)
+    counts = {w: n - words_freq.get(w, 0) for w, n in model.tagger.words_freq.items()}
+    return model, counts
+
+def mix(models, sizes, words_freq):
+    """
+    Mixes the shard models into a new parser, ready for the next epoch.
+    The tag dictionary of the new parser is the union of those of the shard
+    models.
+    """
+    total = sum(sizes)
+    mixture = [n / total for n in sizes]
+    model = P.Parser()
+    model.feature_set = models[0].feature_set
+    model.tagger.feature_set = models[0].tagger.feature_set
+    model.classifier.weights = type(models[0].classifier.weights).mix([m.classifier.weights for m in models], mixture)
+    model.classifier.classes = model.classifier.weights.classes
+    model.tagger.weights = type(models[0].tagger.weights).mix([m.tagger.weights for m in models], mixture)
+    model.tagger.tags = model.tagger.weights.classes
+    model.tagger.words_freq = words_freq
+    for m in models:
+        for word, tags in m.tagger.tag_dict.items():
+            model.tagger.tag_dict.setdefault(word, set()).update(tags)
+    return model
+
+def train(sentences, epochs=1, workers=None, model=None, verbose=False,
+          checkpoint=None, checkpoint_every=1000, resume=False):
+    """
+    Trains a parser on a list of (words, tags, tree) triples (or a
+    `corpus.Corpus`) for a number of epochs with iterative parameter
+    mixing over `workers` processes (by default, one per CPU), and returns
+    the mixed model. Training starts from `model` if it is given.
+
+    If `checkpoint` is a file name, checkpoints are saved there (with a
+    single worker, every `checkpoint_every` sentences and at the end of
+    every epoch). If `resume` is true and the checkpoint exists, training
+    resumes from it instead of starting from `model`, which must have the
+    same configuration (see `checkpoint.configuration()`). The sentences
+    must then begin with those the checkpoint was saved with; if there are
+    more of them, training continues on the new ones, which needs a single
+    worker and a single epoch. Otherwise, a `ValueError` is raised.
+    """
+    sentences = list(sentences)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(sentences)))
+    if model is None:
+        model = P.Parser()
+
+    total = len(sentences)
+    data = digest(sentences) if checkpoint is not None else None
+    start_epoch = 0
+    start = 0
+    if resume and checkpoint is not None and os.path.isfile(checkpoint):
+        state = K.load_checkpoint(checkpoint)
+        if state['config'] != K.configuration(model):
+            raise ValueError("checkpoint {} was saved with other feature templates or hashing".format(checkpoint))
+        if state['workers'] != workers:
+            raise ValueError("checkpoint {} was saved with {} workers, not {}".format(
+                checkpoint, state['workers'], workers))
+        if state['total'] > total or digest(sentences[:state['total']]) != state['digest']:
+            raise ValueError("checkpoint {} was saved while training on other sentences".format(checkpoint))
+        if state['total'] < total and (epochs != 1 or workers != 1):
+            raise ValueError("checkpoint {} can only be continued on new sentences with one worker "
+                             "and one epoch".format(checkpoint))
+        model, start_epoch, start = state['model'], state['epoch'], state['sentence']
+
+    parts = shards(sentences, workers)
+    sizes = [len(part) for part in parts]
+    with ProcessPoolExecutor(workers) if workers > 1 else nullcontext() as pool:
+        for epoch in range(start_epoch, epochs):
+            words_freq = dict(model.tagger.words_freq)
+            model.tagger.count_words = epoch == 0
+            if workers == 1:
+                progress = None
+                if checkpoint is not None:
+                    def progress(m, k, epoch=epoch):
+                        if k % checkpoint_every == 0 or k == len(sentences):
+                            K.save_checkpoint(m, checkpoint, epoch, k, 1, total, data)
+                results = [train_shard(model, parts[0], start, progress)]
+                start = 0
+            else:
+                results = list(pool.map(train_shard, [model] * workers, parts))
+            for _, counts in results:
+                for w, n in counts.items():
+                    words_freq[w] = words_freq.get(w, 0) + n
+            model = mix([m for m, _ in results], sizes, words_freq)
+            if checkpoint is not None and (workers > 1 or epoch + 1 < epochs):
+                K.save_checkpoint(model, checkpoint, epoch + 1, 0, workers, total, data)
+            if verbose:
+                print("Finished epoch #{}".format(epoch + 1))
+    # A model resumed from the end of a later epoch still has counting off.
+    model.tagger.count_words = True
+    return model
@@ -0,0 +1,98 @@
+"""
+Read-only feature vocabularies that live in a buffer instead of a dict.
+
+A `MappedVocab` maps the strings of a list (the features of a weight table,
+in order of their ids) to their ids, like a dict, but all of its data is in
+three flat buffers: the strings, separated by newlines and encoded in
+UTF-8; the byte offset of every string; and an open-addressing hash table
+of ids. When the buffers are slices of a memory-mapped model file, looking
+up a feature creates no objects that outlive the lookup, so processes that
+map the same file share the vocabulary in memory, and forked processes do
+not copy it by touching reference counts, as they do with a dict of
+strings. A lookup costs more than one in a dict, though.
+
+The hash of a string is the CRC-32 of its UTF-8 encoding, so that it is the
+same in every process, and the table is probed linearly. A slot holds the
+id of a string plus one, or zero if it is empty.
+"""
+
+import zlib
+from array import array
+from collections.abc import Mapping
+
+def build(strings):
+    """
+    Returns the offsets and the hash table of a list of strings, as uint32
+    arrays, for the strings encoded with `model_storer.encode_strings()`.
+    """
+    offsets = array('I')
+    position = 0
+    encoded = [s.encode('utf-8') for s in strings]
+    for s in encoded:
+        offsets.append(position)
+        position += len(s) + 1
+    offsets.append(position)
+
+    size = 1
+    while size < 2 * len(encoded):
+        size *= 2
+    mask = size - 1
+    index = array('I', bytes(4 * size))
+    for k, s in enumerate(encoded):
+        h = zlib.crc32(s) & mask
+        while index[h] != 0:
+            h = (h + 1) & mask
+        index[h] = k + 1
+    return offsets, index
+
+class MappedVocab(Mapping):
+    """
+    A read-only mapping from strings to ids over a strings buffer, an array
+    of offsets and a hash table (see `build()`).
+    """
+
+    def __init__(self, data, offsets, index):
+        self.data = data
+        self.offsets = offsets
+        self.index = index
+        self.mask = len(index) - 1
+
+    def __getstate__(self):
+        return {'data': bytes(self.data), 'offsets': array('I', self.offsets), 'index': array('I', self.index)}
+
+    def __setstate__(self, state):
+        self.__init__(state['data'], state['offsets'], state['index'])
+
+    def get(self, key, default=None):
+        s = key.encode('utf-8')
+        index = self.index
+        offsets = self.offsets
+        data = self.data
+        mask = self.mask
+        h = zlib.crc32(s) & mask
+        while True:
+            slot = index[h]
+            if slot == 0:
+                return default
+            start = offsets[slot - 1]
+            end = offsets[slot] - 1
+            if end - start == len(s) and data[start:end] == s:
+                return slot - 1
+            h = (h + 1) & mask
+
+    def __getitem__(self, key):
+        k = self.get(key)
+        if k is None:
+            raise KeyError(key)
+        return k
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        offsets = self.offsets
+        for k in range(len(self)):
+            yield str(self.data[offsets[k]:offsets[k + 1] - 1], 'utf-8')
@@ -0,0 +1,262 @@
+from array import array
+from operator import add, mul
+
+def best(classes, class_ids, scores, candidates=None):
+    """
+    Returns the class with the highest activation and its activation.
+
+    Ties are broken in favour of the greatest class, as in the original
+    dictionary-based implementation. If `candidates` is given, only those
+    classes are considered.
+    """
+    if candidates is not None:
+        return max(((scores[class_ids[c]], c) for c in candidates))[::-1]
+    top = max(scores)
+    if scores.count(top) == 1:
+        return classes[scores.index(top)], top
+    return max(c for c, s in zip(classes, scores) if s == top), top
+
+class WeightTable():
+    """
+    A table of perceptron weights indexed by interned features.
+
+    Every feature string is mapped to an integer id the first time it is
+    seen during training. The weights of all features are stored in one
+    flat array, feature after feature, with one cell per class, so that the
+    activations of all classes for a feature vector are computed by adding
+    up the rows of its features, instead of looking up every (class,
+    feature) pair in a dictionary.
+
+    Next to the weights, the table keeps the accumulated updates that are
+    needed to average the weights when training is finished, in a second
+    flat array of the same layout. Keeping the rows in two flat arrays,
+    instead of two arrays per feature, saves the overhead of an array object
+    per row, which is larger than the row itself for small numbers of
+    classes.
+    """
+
+    def __init__(self):
+        self.classes = []
+        self.class_ids = {}
+        self.feature_ids = {}
+        self.weights = array('d')
+        self.acc = array('d')
+
+    def row(self, k):
+        """
+        Returns a copy of the weights of feature `k`.
+        """
+        n = len(self.classes)
+        return self.weights[k * n:k * n + n]
+
+    def add_class(self, c):
+        """
+        Adds a new class, with zero weights for all known features.
+        """
+        n = len(self.classes)
+        self.class_ids[c] = n
+        self.classes.append(c)
+        self.weights = widen(self.weights, len(self.feature_ids), n)
+        self.acc = widen(self.acc, len(self.feature_ids), n)
+
+    def intern(self, f):
+        """
+        Returns the id of the feature `f`, adding a zero row if it is new.
+        """
+        k = self.feature_ids.get(f)
+        if k is None:
+            k = len(self.feature_ids)
+            self.feature_ids[f] = k
+            zeros = bytes(8 * len(self.classes))
+            self.weights.frombytes(zeros)
+            self.acc.frombytes(zeros)
+        return k
+
+    def lookup(self, x):
+        """
+        Returns the ids of the known features in the feature vector `x`.
+
+        Features that occur several times in `x` are returned several times,
+        unknown features are skipped, as their weights are all zero.
+        """
+        ids = self.feature_ids
+        return [ids[f] for f in x if f in ids]
+
+    def scores(self, ids, base=None):
+        """
+        Returns the activations of all classes for a list of feature ids,
+        added to the activations in `base` if it is given.
+        """
+        w = self.weights
+        n = len(self.classes)
+        rows = [w[k * n:k * n + n] for k in ids]
+        if base is not None:
+            rows.append(base)
+        if len(rows) == 0:
+            return [0.0] * n
+        if len(rows) == 1:
+            return list(rows[0])
+        return list(map(sum, zip(*rows)))
+
+    def best(self, scores, candidates=None):
+        """
+        Returns the class with the highest activation and its activation.
+        """
+        return best(self.classes, self.class_ids, scores, candidates)
+
+    def freeze(self):
+        """
+        Returns a read-only copy of the (averaged) weights in this table.
+        """
+        return FrozenTable(self.classes, dict(self.feature_ids), array('d', self.weights))
+
+    def update(self, ids, y, p, count):
+        """
+        Rewards the class `y` and penalizes the class `p` for every feature.
+        """
+        n = len(self.classes)
+        yi = self.class_ids[y]
+        pi = self.class_ids[p]
+        w = self.weights
+        acc = self.acc
+        for k in ids:
+            b = k * n
+            w[b + pi] -= 1
+            acc[b + pi] -= count
+            w[b + yi] += 1
+            acc[b + yi] += count
+
+    def finalize(self, count):
+        """
+        Averages the weights over `count` training steps.
+        """
+        w = self.weights
+        acc = self.acc
+        for i in range(len(w)):
+            w[i] -= acc[i] / count
+
+    def to_dict(self):
+        """
+        Returns the weights as a dictionary from classes to dictionaries
+        from features to weights.
+        """
+        n = len(self.classes)
+        w = self.weights
+        return {c: {f: w[k * n + j] for f, k in self.feature_ids.items()}
+                for j, c in enumerate(self.classes)}
+
+    @classmethod
+    def mix(cls, tables, mixture):
+        """
+        Returns the weighted average of a list of tables.
+
+        The classes and features of the result are the union of those of the
+        tables, `mixture` gives the weight of every table, and the
+        accumulated updates of the result are all zero.
+        """
+        table = cls()
+        for t in tables:
+            for c in t.classes:
+                if c not in table.class_ids:
+                    table.add_class(c)
+        n = len(table.classes)
+        w = table.weights
+        for t, mu in zip(tables, mixture):
+            js = [table.class_ids[c] for c in t.classes]
+            for f, k in t.feature_ids.items():
+                b = table.intern(f) * n
+                for j, x in zip(js, t.row(k)):
+                    w[b + j] += mu * x
+        return table
+
+    @classmethod
+    def from_dict(cls, weights, classes):
+        """
+        Builds a table from a dictionary as returned by `to_dict()`.
+        """
+        table = cls()
+        for c in classes:
+            table.add_class(c)
+        n = len(classes)
+        for j, c in enumerate(classes):
+            for f, w in weights.get(c, {}).items():
+                table.weights[table.intern(f) * n + j] = w
+        return table
+
+def widen(flat, m, n):
+    """
+    Returns a copy of a flat array of `m` rows of `n` cells with a zero cell
+    added at the end of every row.
+    """
+    result = array('d', bytes(8 * m * (n + 1)))
+    for j in range(n):
+        result[j::n + 1] = flat[j::n]
+    return result
+
+class FrozenTable():
+    """
+    A read-only table of perceptron weights for inference.
+
+    The weights of all features are stored in one flat buffer, feature after
+    feature, with one cell per class. Unlike `WeightTable`, this table never
+    adds features or classes: unknown features are simply skipped when
+    scoring, so the memory used by a model does not grow with the amount of
+    text it is applied to. The buffer can be any object that supports the
+    buffer protocol, such as an array or a memory-mapped file, and the
+    feature ids can be a dict or a `vocab.MappedVocab`.
+
+    The weights can also be quantized, as integers that are multiplied by a
+    scale per class: `weights[k * n + j] * scales[j]` is the weight of
+    feature `k` for class `j`.
+    """
+
+    def __init__(self, classes, feature_ids, weights, scales=None):
+        self.classes = list(classes)
+        self.class_ids = {c: j for j, c in enumerate(self.classes)}
+        self.feature_ids = feature_ids
+        self.weights = memoryview(weights).toreadonly()
+        self.scales = list(scales) if scales is not None else None
+        self.n = len(self.classes)
+
+    def __reduce__(self):
+        return (FrozenTable, (self.classes, self.feature_ids, array(self.weights.format, self.weights), self.scales))
+
+    def lookup(self, x):
+        """
+        Returns the ids of the known features in the feature vector `x`.
+        """
+        return [k for k in map(self.feature_ids.get, x) if k is not None]
+
+    def scores(self, ids, base=None):
+        """
+        Returns the activations of all classes for a list of feature ids,
+        added to the activations in `base` if it is given.
+        """
+        w = self.weights
+        n = self.n
+        rows = [w[k * n:k * n + n] for k in ids]
+        if self.scales is not None:
+            totals = list(map(mul, map(sum, zip(*rows)), self.scales)) if len(rows) > 0 else [0.0] * n
+            return list(map(add, totals, base)) if base is not None else totals
+        if base is not None:
+            rows.append(base)
+        if len(rows) == 0:
+            return [0.0] * n
+        if len(rows) == 1:
+            return list(rows[0])
+        return list(map(sum, zip(*rows)))
+
+    def best(self, scores, candidates=None):
+        """
+        Returns the class with the highest activation and its activation.
+        """
+        return best(self.classes, self.class_ids, scores, candidates)
+
+    def to_dict(self):
+        """
+        Returns the weights as a dictionary from classes to dictionaries
+        from features to weights.
+        """
+        scales = self.scales if self.scales is not None else [1.0] * self.n
+        return {c: {f: self.weights[k * self.n + j] * scales[j] for f, k in self.feature_ids.items()}
+                for j, c in enumerate(self.classes)}